@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        # Хуки SQL для метрик и QueryInspector ставятся на соединения при
+        # подключении, поэтому модули нужны до первого запроса к базе.
+        from config import metrics, queries  # noqa: F401
+
+        from . import signals  # noqa: F401
@@ -0,0 +1,265 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from config.prometheus import record_cache
+from recipes.models import Recipe, Tag
+from recipes.versions import (
+    aget_catalog_version,
+    aget_content_version,
+    aget_viewer_version,
+    datetime_version,
+)
+
+from api.cache import (
+    make_etag,
+    make_validators,
+    response_cache_key,
+    set_validators,
+)
+from api.ingredients.index import ingredient_index
+from api.ingredients.views import IngredientViewSet, get_search_limit
+from api.loaders import ViewerState
+from api.recipe.views import RecipeViewSet
+from api.tags.serializers import TagSerializer
+from api.tags.views import TagViewSet
+from api.users.views import SubscribeListView
+
+JSON_MEDIA_TYPES = ("application/json", "application/*", "*/*")
+
+
+def renders_plain_json(request):
+    """Синхронное представление ответило бы JSONRenderer'ом без опций.
+
+    Браузерная версия API, ?format= и параметры вроде indent остаются
+    синхронным представлениям, чтобы тело под одним ETag не различалось.
+    """
+    if "format" in request.GET:
+        return False
+    media_types = set()
+    for media_range in request.headers.get("Accept", "*/*").split(","):
+        media_type, *params = media_range.split(";")
+        if any(not param.strip().startswith("q=") for param in params):
+            return False
+        media_types.add(media_type.strip())
+    if "application/json" in media_types:
+        return True
+    return "text/html" not in media_types and any(
+        media_type in media_types for media_type in JSON_MEDIA_TYPES
+    )
+
+
+async def aauthenticate(request):
+    """TokenAuthentication без потока.
+
+    Возвращает пользователя, AnonymousUser без заголовка Authorization или
+    None, если токен неверный: ошибку тогда отдает синхронное
+    представление.
+    """
+    auth = request.headers.get("Authorization", "").split()
+    if not auth or auth[0].lower() != "token":
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    try:
+        token = await Token.objects.select_related("user").aget(key=auth[1])
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def json_response(data):
+    return HttpResponse(
+        JSONRenderer().render(data), content_type=JSONRenderer.media_type
+    )
+
+
+async def conditional_json(request, validators, build=None, vary=()):
+    """Асинхронный ConditionalGetMixin.conditional_response.
+
+    build — корутина, возвращающая данные ответа. Если ее нет или она
+    вернула None, ответ собирает синхронное представление.
+    """
+    parts, last_modified = validators
+    etag = make_etag(request, JSONRenderer.format, parts)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        data = None if build is None else await build()
+        if data is None:
+            return None
+        response = json_response(data)
+    # Vary: Accept синхронные представления получают от DRF.
+    return set_validators(response, etag, last_modified, (*vary, "Accept"))
+
+
+def read_view(sync_view, fast_path):
+    """Async-представление поверх синхронного вьюсета DRF.
+
+    GET-запрос за JSON сначала обрабатывает fast_path: 304, ответ из кэша
+    или справочник в памяти. Все остальное, включая запись и промахи
+    кэша, выполняет sync_view в потоке, как Django выполняет синхронные
+    представления под ASGI.
+    """
+    run_sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method == "GET" and renders_plain_json(request):
+            response = await fast_path(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await run_sync_view(request, *args, **kwargs)
+
+    # Синхронные вьюсеты DRF сами освобождены от CSRF, а csrf_exempt из
+    # Django 4.2 превращает корутину в обычную функцию.
+    view.csrf_exempt = True
+    # По cls и actions метрики называют маршрут так же, как под WSGI.
+    view.cls = sync_view.cls
+    view.actions = getattr(sync_view, "actions", None)
+    return view
+
+
+async def recipes_fast_path(request, pk=None):
+    user = await aauthenticate(request)
+    if user is None:
+        return None
+    versions = []
+    user_id = None
+    if user.is_authenticated:
+        user_id = user.pk
+        versions.append(await aget_viewer_version(user_id))
+    if pk is None:
+        versions.append(await aget_content_version())
+    else:
+        updated_at = (
+            await Recipe.objects.filter(pk=pk)
+            .values_list("updated_at", flat=True)
+            .afirst()
+        )
+        if updated_at is None:
+            return None
+        versions += [
+            await aget_catalog_version(),
+            datetime_version(updated_at),
+        ]
+
+    async def build():
+        if any(request.GET.get(name) for name in RecipeViewSet.viewer_filters):
+            return None
+        key = response_cache_key(
+            request, "recipes", await aget_content_version()
+        )
+        data = await cache.aget(key)
+        record_cache("response", data is not None)
+        if data is not None and user.is_authenticated:
+            state = ViewerState(user)
+            RecipeViewSet.prime_viewer_state(data, state)
+            for relation in ViewerState.RELATIONS:
+                await state.aload(relation)
+            RecipeViewSet.set_viewer_flags(data, state)
+        return data
+
+    return await conditional_json(
+        request,
+        make_validators(versions, user_id),
+        build,
+        RecipeViewSet.conditional_vary,
+    )
+
+
+async def tags_fast_path(request, pk=None):
+    queryset = Tag.objects.values(*TagSerializer.Meta.fields)
+
+    async def build():
+        if pk is None:
+            return [tag async for tag in queryset.aiterator()]
+        try:
+            return await queryset.aget(pk=pk)
+        except Tag.DoesNotExist:
+            return None
+
+    return await conditional_json(
+        request, make_validators((await aget_catalog_version(),)), build
+    )
+
+
+async def ingredients_fast_path(request, pk=None):
+    if not settings.INGREDIENTS_INDEX_ENABLED:
+        return None
+
+    async def build():
+        snapshot = await ingredient_index.asnapshot()
+        if pk is not None:
+            return ingredient_index.get(pk, snapshot)
+        return ingredient_index.search(
+            request.GET.get("name", ""), get_search_limit(request), snapshot
+        )
+
+    return await conditional_json(
+        request, make_validators((await aget_catalog_version(),)), build
+    )
+
+
+async def subscriptions_fast_path(request):
+    user = await aauthenticate(request)
+    if user is None or not user.is_authenticated:
+        return None
+    versions = (
+        await aget_viewer_version(user.pk),
+        await aget_content_version(),
+    )
+    return await conditional_json(
+        request,
+        make_validators(versions, user.pk),
+        vary=SubscribeListView.conditional_vary,
+    )
+
+
+recipe_list = read_view(
+    RecipeViewSet.as_view(
+        {"get": "list", "post": "create"}, basename="recipes", detail=False
+    ),
+    recipes_fast_path,
+)
+recipe_detail = read_view(
+    RecipeViewSet.as_view(
+        {
+            "get": "retrieve",
+            "put": "update",
+            "patch": "partial_update",
+            "delete": "destroy",
+        },
+        basename="recipes",
+        detail=True,
+    ),
+    recipes_fast_path,
+)
+tag_list = read_view(
+    TagViewSet.as_view({"get": "list"}, basename="tags", detail=False),
+    tags_fast_path,
+)
+tag_detail = read_view(
+    TagViewSet.as_view({"get": "retrieve"}, basename="tags", detail=True),
+    tags_fast_path,
+)
+ingredient_list = read_view(
+    IngredientViewSet.as_view(
+        {"get": "list"}, basename="ingredients", detail=False
+    ),
+    ingredients_fast_path,
+)
+ingredient_detail = read_view(
+    IngredientViewSet.as_view(
+        {"get": "retrieve"}, basename="ingredients", detail=True
+    ),
+    ingredients_fast_path,
+)
+subscriptions = read_view(
+    SubscribeListView.as_view(), subscriptions_fast_path
+)
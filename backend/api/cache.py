@@ -0,0 +1,111 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+from recipes.versions import (
+    get_catalog_version,
+    get_content_version,
+    version_timestamp,
+)
+
+
+def request_fingerprint(request, exclude=()):
+    """Хэш хоста, пути и нормализованных параметров запроса.
+
+    Параметры сортируются, поэтому ?tags=a&tags=b и ?tags=b&tags=a
+    дают один хэш. Хост входит в него, так как ссылки пагинации в ответе
+    абсолютные. Параметры из exclude не учитываются.
+    """
+    # GET есть и у Django-запроса, и у Request из DRF.
+    params = request.GET
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key in params
+            if key not in exclude
+            for value in params.getlist(key)
+        )
+    )
+    return hashlib.md5(
+        f"{request.get_host()}{request.path}?{query}".encode()
+    ).hexdigest()
+
+
+def response_cache_key(request, prefix, version=None):
+    """Ключ кэша ответа: версия содержимого и нормализованный запрос."""
+    if version is None:
+        version = get_content_version()
+    digest = request_fingerprint(request)
+    return f"response:{prefix}:{version}:{digest}"
+
+
+def make_validators(versions, user_id=None):
+    """Части ETag и Last-Modified по версиям ответа.
+
+    Для ответа с данными пользователя в ETag входит его id, а среди
+    versions должна быть его версия.
+    """
+    parts = list(versions) if user_id is None else [user_id, *versions]
+    return parts, version_timestamp(*versions)
+
+
+def make_etag(request, renderer_format, parts):
+    parts = (request_fingerprint(request), renderer_format, *parts)
+    return quote_etag(
+        hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+    )
+
+
+def set_validators(response, etag, last_modified, vary=()):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if vary:
+        patch_vary_headers(response, vary)
+    return response
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы с ETag и Last-Modified для вьюсетов.
+
+    Валидаторы считаются из версий и дат изменения до сериализации, так
+    что при совпадении If-None-Match или If-Modified-Since клиент сразу
+    получает 304 без тела.
+    """
+
+    # Заголовки, от которых зависит содержимое ответа.
+    conditional_vary = ()
+
+    def get_validators(self, request, *args, **kwargs):
+        """Возвращает (части ETag, Last-Modified) или None.
+
+        None отключает условный ответ, например для несуществующего
+        объекта.
+        """
+        return None
+
+    def conditional_response(self, build, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return build(request, *args, **kwargs)
+        parts, last_modified = validators
+        etag = make_etag(request, request.accepted_renderer.format, parts)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = build(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return set_validators(
+            response, etag, last_modified, self.conditional_vary
+        )
+
+
+class CatalogConditionalMixin(ConditionalGetMixin):
+    """Валидаторы справочника по версии тегов и ингредиентов."""
+
+    def get_validators(self, request, *args, **kwargs):
+        return make_validators((get_catalog_version(),))
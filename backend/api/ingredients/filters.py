@@ -1,11 +1,27 @@
+from django.db.models import Case, IntegerField, Value, When
 from django_filters import rest_framework as filters
 
 from recipes.models import Ingredient
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr="istartswith")
+    """Поиск ингредиентов: сначала совпадения по началу, затем по вхождению."""
+
+    name = filters.CharFilter(method="filter_name")
 
     class Meta:
         model = Ingredient
         fields = ("name",)
+
+    def filter_name(self, queryset, name, value):
+        return (
+            queryset.filter(name__icontains=value)
+            .annotate(
+                rank=Case(
+                    When(name__istartswith=value, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by("rank", "name")
+        )
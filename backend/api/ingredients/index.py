@@ -0,0 +1,113 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+
+from config.prometheus import record_cache
+from recipes.models import Ingredient
+from recipes.versions import aget_catalog_version, get_catalog_version
+
+Snapshot = namedtuple(
+    "Snapshot", ("keys", "items", "by_id", "built_at", "version")
+)
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Отсортированный по названию массив ищется через bisect, поиск по
+    вхождению проходит по тем же ~2000 строкам без обращения к базе.
+    Сигналы сбрасывают индекс в текущем процессе, а в остальных воркерах
+    он пересобирается при смене версии справочников в общем кэше или по
+    истечении INGREDIENTS_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def queryset(self):
+        return Ingredient.objects.values("id", "name", "measurement_unit")
+
+    def make_snapshot(self, items, version):
+        items = sorted(
+            items, key=lambda item: (item["name"].upper(), item["id"])
+        )
+        return Snapshot(
+            keys=[item["name"].upper() for item in items],
+            items=items,
+            by_id={item["id"]: item for item in items},
+            built_at=time.monotonic(),
+            version=version,
+        )
+
+    def build(self, version):
+        return self.make_snapshot(self.queryset(), version)
+
+    def is_stale(self, snapshot, version):
+        return (
+            snapshot is None
+            or snapshot.version != version
+            or time.monotonic() - snapshot.built_at
+            > settings.INGREDIENTS_INDEX_TTL
+        )
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        version = get_catalog_version()
+        stale = self.is_stale(snapshot, version)
+        record_cache("ingredient_index", not stale)
+        if stale:
+            with self._lock:
+                if self._snapshot is snapshot:
+                    self._snapshot = self.build(version)
+                snapshot = self._snapshot
+        return snapshot
+
+    async def asnapshot(self):
+        """snapshot() для async-представлений.
+
+        Цикл событий однопоточный, поэтому блокировка не нужна: в худшем
+        случае индекс параллельно соберет и поток синхронного запроса.
+        """
+        snapshot = self._snapshot
+        version = await aget_catalog_version()
+        stale = self.is_stale(snapshot, version)
+        record_cache("ingredient_index", not stale)
+        if stale:
+            items = [item async for item in self.queryset().aiterator()]
+            snapshot = self._snapshot = self.make_snapshot(items, version)
+        return snapshot
+
+    def get(self, pk, snapshot=None):
+        return (snapshot or self.snapshot()).by_id.get(pk)
+
+    def search(self, query, limit, snapshot=None):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        snapshot = snapshot or self.snapshot()
+        if not query:
+            return snapshot.items[:limit]
+        query = query.upper()
+        result = []
+        for position in range(
+            bisect_left(snapshot.keys, query), len(snapshot.keys)
+        ):
+            if len(result) >= limit:
+                return result
+            if not snapshot.keys[position].startswith(query):
+                break
+            result.append(snapshot.items[position])
+        for key, item in zip(snapshot.keys, snapshot.items):
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(item)
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -1,16 +1,77 @@
+from django.conf import settings
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from config.metrics import SerializeTimingMixin
 from recipes.models import Ingredient
+from api.cache import CatalogConditionalMixin
 from .filters import IngredientFilter
+from .index import ingredient_index
 from .serializers import IngredientSerializer
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
-    queryset = Ingredient.objects.all()
+def get_search_limit(request):
+    """Размер выдачи из ?limit, не больше INGREDIENTS_SEARCH_LIMIT."""
+    limit = settings.INGREDIENTS_SEARCH_LIMIT
+    try:
+        requested = int(request.GET.get("limit", limit))
+    except ValueError:
+        return limit
+    return min(max(requested, 1), limit)
+
+
+class IngredientViewSet(
+    SerializeTimingMixin, CatalogConditionalMixin, ReadOnlyModelViewSet
+):
+    """Вьюсет для ингредиентов с ограничением размера выдачи.
+
+    По умолчанию список и поиск отдаются из индекса в памяти процесса,
+    без запросов к базе.
+    """
+
+    queryset = Ingredient.objects.order_by("name")
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+
+    def get_limit(self):
+        return get_search_limit(self.request)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.search_ingredients, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_ingredient, request, *args, **kwargs
+        )
+
+    def search_ingredients(self, request, *args, **kwargs):
+        if settings.INGREDIENTS_INDEX_ENABLED:
+            return Response(
+                ingredient_index.search(
+                    request.query_params.get("name", ""), self.get_limit()
+                )
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(
+            queryset[: self.get_limit()], many=True
+        )
+        return Response(serializer.data)
+
+    def get_ingredient(self, request, *args, **kwargs):
+        if not settings.INGREDIENTS_INDEX_ENABLED:
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            ingredient = ingredient_index.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            ingredient = None
+        if ingredient is None:
+            raise Http404
+        return Response(ingredient)
@@ -0,0 +1,92 @@
+from django.db import models
+from rest_framework import serializers
+
+from recipes.models import FavoriteRecipe, ShoppingList
+from users.models import Follow
+
+
+class ViewerState:
+    """Связи текущего пользователя с объектами ответа на время запроса.
+
+    Работает в духе DataLoader: id объектов сначала накапливаются через
+    prime(), а при первой проверке одним запросом на связь выбирается,
+    какие из них есть в избранном, корзине или подписках пользователя.
+    Дальше каждая проверка — поиск в множестве.
+    """
+
+    RELATIONS = {
+        "favorites": (FavoriteRecipe, "recipe_id"),
+        "shopping_cart": (ShoppingList, "recipe_id"),
+        "following": (Follow, "follower_id"),
+    }
+
+    def __init__(self, user):
+        self.user = user
+        self.pending = {relation: set() for relation in self.RELATIONS}
+        self.checked = {relation: set() for relation in self.RELATIONS}
+        self.found = {relation: set() for relation in self.RELATIONS}
+
+    @classmethod
+    def for_request(cls, request):
+        state = getattr(request, "_viewer_state", None)
+        if state is None:
+            state = request._viewer_state = cls(request.user)
+        return state
+
+    def prime(self, relation, ids):
+        self.pending[relation].update(ids)
+
+    def take_pending(self, relation):
+        ids = self.pending[relation] - self.checked[relation]
+        self.pending[relation] = set()
+        return ids
+
+    def relation_queryset(self, relation, ids):
+        model, field = self.RELATIONS[relation]
+        return model.objects.filter(
+            user=self.user, **{f"{field}__in": ids}
+        ).values_list(field, flat=True)
+
+    def load(self, relation):
+        ids = self.take_pending(relation)
+        if not ids:
+            return
+        self.found[relation].update(self.relation_queryset(relation, ids))
+        self.checked[relation].update(ids)
+
+    async def aload(self, relation):
+        """Асинхронный load() для async-представлений."""
+        ids = self.take_pending(relation)
+        if not ids:
+            return
+        queryset = self.relation_queryset(relation, ids)
+        self.found[relation].update([pk async for pk in queryset.aiterator()])
+        self.checked[relation].update(ids)
+
+    def contains(self, relation, pk):
+        if not self.user.is_authenticated:
+            return False
+        if pk not in self.checked[relation]:
+            self.prime(relation, (pk,))
+            self.load(relation)
+        return pk in self.found[relation]
+
+
+def viewer_has(context, relation, pk):
+    request = context.get("request")
+    if request is None:
+        return False
+    return ViewerState.for_request(request).contains(relation, pk)
+
+
+class ViewerStateListSerializer(serializers.ListSerializer):
+    """Перед сериализацией списка передает id его объектов в ViewerState."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        request = self.context.get("request")
+        if request is not None and request.user.is_authenticated:
+            self.child.prime_viewer_state(
+                ViewerState.for_request(request), items
+            )
+        return super().to_representation(items)
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from .views import PrometheusMetricsView, RequestMetricsView
+
+urlpatterns = [
+    path("metrics/", PrometheusMetricsView.as_view(), name="metrics"),
+    path(
+        "metrics/requests/",
+        RequestMetricsView.as_view(),
+        name="request-metrics",
+    ),
+]
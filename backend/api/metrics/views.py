@@ -0,0 +1,48 @@
+import os
+
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from config.metrics import DURATION_BUCKETS, request_histograms
+from config.prometheus import get_registry
+from api.permissions import IsMetricsScraper
+
+
+class PrometheusMetricsView(APIView):
+    """Метрики в текстовом формате Prometheus, суммарно по воркерам."""
+
+    authentication_classes = ()
+    permission_classes = (IsMetricsScraper,)
+
+    def get(self, request):
+        return HttpResponse(
+            generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+        )
+
+
+class RequestMetricsView(APIView):
+    """Гистограммы запросов по маршрутам для администраторов.
+
+    Статистика своя у каждого воркера, в ответе — воркер, который принял
+    запрос. DELETE обнуляет ее, например сразу после деплоя.
+    """
+
+    permission_classes = (IsAdminUser,)
+    pagination_class = None
+
+    def get(self, request):
+        return Response(
+            {
+                "pid": os.getpid(),
+                "buckets_ms": DURATION_BUCKETS,
+                "routes": request_histograms.snapshot(),
+            }
+        )
+
+    def delete(self, request):
+        request_histograms.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,5 +1,173 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from config.prometheus import record_cache
+from recipes.versions import get_content_version, get_viewer_version
+from api.cache import request_fingerprint
+
+
+def estimate_count(queryset):
+    """Оценка числа строк планировщиком Postgres без выполнения запроса."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CountedPaginator(Paginator):
+    """Paginator, которому число объектов считает переданная функция."""
+
+    def __init__(self, object_list, per_page, count_function, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_function = count_function
+
+    @cached_property
+    def count(self):
+        return self.count_function(self.object_list)
+
+
+class UncountedPage(Page):
+    def has_next(self):
+        return self.has_more
+
+
+class UncountedPaginator(Paginator):
+    """Paginator без COUNT(*), count в ответе — null.
+
+    Наличие следующей страницы определяется по лишней строке в выборке.
+    """
+
+    count = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.known_pages = 1
+
+    @property
+    def num_pages(self):
+        return self.known_pages
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage("Номер страницы меньше 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page + 1
+        items = list(self.object_list[bottom:top])
+        if not items and number > 1:
+            raise EmptyPage("На этой странице нет результатов")
+        page = UncountedPage(items[: self.per_page], number, self)
+        page.has_more = len(items) > self.per_page
+        self.known_pages = number + page.has_more
+        return page
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная пагинация по ключу из cursor_ordering вьюсета.
+
+    Следующая страница выбирается условием по первому полю ключа вместо
+    OFFSET, а COUNT(*) не выполняется вовсе, поэтому глубина прокрутки не
+    влияет на время ответа.
+    """
+
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return view.cursor_ordering
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация, совместимая с фронтендом.
+
+    Если вьюсет задает cursor_ordering и в запросе есть параметр cursor
+    (для первой страницы — пустой), включается курсорный режим.
+
+    Число объектов кэшируется по нормализованному набору фильтров с
+    версией содержимого в ключе, выше PAGINATION_COUNT_ESTIMATE_THRESHOLD
+    на Postgres берется оценка планировщика, а с ?count=false не
+    считается вовсе.
+    """
+
     page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    # Параметры, которые не влияют на число объектов.
+    page_params = ("page", "limit", "cursor", "count")
+
+    def __init__(self):
+        self.keyset = None
+        self.view = None
+
+    def django_paginator_class(self, object_list, per_page):
+        if self.request.query_params.get(self.count_query_param) in (
+            "0",
+            "false",
+        ):
+            return UncountedPaginator(object_list, per_page)
+        return CountedPaginator(object_list, per_page, self.get_count)
+
+    def get_count_cache_key(self):
+        request = self.request
+        key = (
+            f"count:{get_content_version()}:"
+            f"{request_fingerprint(request, exclude=self.page_params)}"
+        )
+        # Число подписок и выборки по избранному и корзине зависят от
+        # пользователя, поэтому кэшируются отдельно с его версией.
+        viewer_filters = getattr(self.view, "viewer_filters", ())
+        if getattr(self.view, "count_per_user", False) or any(
+            request.query_params.get(name) for name in viewer_filters
+        ):
+            user_id = request.user.pk
+            key += f":{user_id}:{get_viewer_version(user_id)}"
+        return key
+
+    def get_count(self, queryset):
+        key = self.get_count_cache_key()
+        count = cache.get(key)
+        record_cache("count", count is not None)
+        if count is None:
+            count = estimate_count(queryset)
+            if (
+                count is None
+                or count < settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+            ):
+                count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        if (
+            getattr(view, "cursor_ordering", None)
+            and self.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,3 +1,7 @@
+import hmac
+import ipaddress
+
+from django.conf import settings
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
@@ -6,3 +10,30 @@ class IsOwnerOrReadOnly(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         return request.method in SAFE_METHODS or obj.author == request.user
+
+
+class IsMetricsScraper(BasePermission):
+    """Доступ по токену METRICS_TOKEN или с адресов METRICS_ALLOWED_IPS.
+
+    Адрес проверяется только при прямом подключении к backend. За nginx
+    REMOTE_ADDR — адрес прокси, поэтому запросы с X-Forwarded-For
+    пропускаются только по токену.
+    """
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        if token and hmac.compare_digest(
+            request.headers.get("Authorization", "").encode(),
+            f"Bearer {token}".encode(),
+        ):
+            return True
+        if "X-Forwarded-For" in request.headers:
+            return False
+        try:
+            address = ipaddress.ip_address(request.META.get("REMOTE_ADDR"))
+        except ValueError:
+            return False
+        return any(
+            address in ipaddress.ip_network(network, strict=False)
+            for network in settings.METRICS_ALLOWED_IPS
+        )
@@ -1,10 +1,49 @@
+import threading
+
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Recipe, Tag
+from config.prometheus import record_cache
+from recipes.models import FavoriteRecipe, Recipe, ShoppingList, Tag
+from recipes.versions import get_catalog_version
+
+
+class TagMap:
+    """Слаги тегов -> id в памяти процесса.
+
+    Перечитывается из базы только при смене версии справочников, поэтому
+    фильтр по тегам не делает отдельного запроса на проверку слагов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids = {}
+
+    def get(self):
+        version = get_catalog_version()
+        record_cache("tag_map", version == self._version)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._ids = dict(Tag.objects.values_list("slug", "id"))
+                    self._version = version
+        return self._ids
+
+
+tag_map = TagMap()
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_map.get()]
 
 
 class RecipeFilter(filters.FilterSet):
-    """Фильтр для рецептов."""
+    """Фильтр для рецептов.
+
+    Каждое условие — подзапрос EXISTS, поэтому рецепты не размножаются
+    джойнами и не нужен DISTINCT ни в выборке, ни в подсчете.
+    """
 
     is_favorited = filters.BooleanFilter(
         method="filter_is_favorited",
@@ -13,14 +52,12 @@ class RecipeFilter(filters.FilterSet):
         method="filter_is_in_shopping_cart",
     )
     author = filters.NumberFilter(
-        field_name="author__id",
+        field_name="author_id",
     )
 
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name="tags__slug",
-        to_field_name="slug",
-        conjoined=False,
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method="filter_tags",
     )
 
     class Meta:
@@ -32,12 +69,37 @@ class RecipeFilter(filters.FilterSet):
             "tags",
         )
 
+    def filter_tags(self, queryset, name, value):
+        tag_ids = tag_map.get()
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"),
+                    tag_id__in=[
+                        tag_ids[slug] for slug in value if slug in tag_ids
+                    ],
+                )
+            )
+        )
+
     def filter_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(
+                Exists(
+                    FavoriteRecipe.objects.filter(
+                        user=self.request.user, recipe=OuterRef("pk")
+                    )
+                )
+            )
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
-            return queryset.filter(shopping_list__user=self.request.user)
+            return queryset.filter(
+                Exists(
+                    ShoppingList.objects.filter(
+                        user=self.request.user, recipe=OuterRef("pk")
+                    )
+                )
+            )
         return queryset
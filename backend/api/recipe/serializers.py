@@ -1,14 +1,21 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.http import Http404
 from rest_framework import serializers
 
+from recipes.images import schedule_image_processing
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
     Recipe,
     RecipeIngredient,
-    ShoppingList,
+    ShoppingCartIngredient,
+    Tag,
 )
+from api.loaders import ViewerStateListSerializer, viewer_has
 from api.tags.serializers import TagSerializer
 from api.users.serializers import AuthorRecipeSerializer
 from .utils import Base64ImageField
@@ -57,6 +64,19 @@ class FavoriteShoppingSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeBatchSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного изменения избранного и корзины."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPES_BATCH_MAX,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для рецептов."""
 
@@ -85,25 +105,29 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_card",
+            "image_thumbnail",
+            "image_status",
             "text",
             "cooking_time",
         )
+        read_only_fields = ("image_card", "image_thumbnail", "image_status")
+        list_serializer_class = ViewerStateListSerializer
+
+    def prime_viewer_state(self, state, recipes):
+        state.prime("favorites", (recipe.id for recipe in recipes))
+        state.prime("shopping_cart", (recipe.id for recipe in recipes))
+        state.prime("following", (recipe.author_id for recipe in recipes))
 
     def get_is_favorited(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return FavoriteRecipe.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        return False
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
+        return viewer_has(self.context, "favorites", obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return ShoppingList.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        return False
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
+        return viewer_has(self.context, "shopping_cart", obj.id)
 
     def validate(self, data):
         ingredients = self.initial_data.get("ingredients")
@@ -123,55 +147,108 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {"ingredients": "Нужен хоть один ингридиент для рецепта"}
             )
-        ingredient_list = []
-        for ingredient_item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=ingredient_item["id"]
+        try:
+            amounts = {
+                int(item["id"]): int(item["amount"]) for item in ingredients
+            }
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                {"ingredients": "Неверный формат ингредиентов"}
+            )
+        if len(amounts) != len(ingredients):
+            raise serializers.ValidationError(
+                "Ингридиенты должны быть уникальными"
+            )
+        if len(Ingredient.objects.in_bulk(amounts)) != len(amounts):
+            raise Http404("Ингредиент не найден.")
+        if any(amount < 0 for amount in amounts.values()):
+            raise serializers.ValidationError(
+                {
+                    "ingredients": (
+                        "Убедитесь, что значение количества "
+                        "ингредиента больше 0"
+                    )
+                }
             )
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    "Ингридиенты должны быть уникальными"
-                )
-            ingredient_list.append(ingredient)
-            if int(ingredient_item["amount"]) < 0:
-                raise serializers.ValidationError(
-                    {
-                        "ingredients": (
-                            "Убедитесь, что значение количества "
-                            "ингредиента больше 0"
-                        )
-                    }
-                )
-        data["ingredients"] = ingredients
+        tag_ids = set(tags)
+        if len(Tag.objects.in_bulk(tag_ids)) != len(tag_ids):
+            raise serializers.ValidationError({"tags": "Тег не найден"})
+        data["ingredients"] = amounts
+        data["tags"] = tag_ids
         return data
 
-    def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(
+    def create_ingredients(self, amounts, recipe):
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
-                ingredient_id=ingredient.get("id"),
-                amount=ingredient.get("amount"),
+                ingredient_id=ingredient_id,
+                amount=amount,
             )
+            for ingredient_id, amount in amounts.items()
+        )
 
+    def update_ingredients(self, amounts, recipe):
+        """Меняет только добавленные, удаленные и измененные ингредиенты."""
+        current = {
+            item.ingredient_id: item
+            for item in recipe.recipeingredient_set.all()
+        }
+        old_amounts = {key: item.amount for key, item in current.items()}
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ("amount",))
+        self.create_ingredients(
+            {
+                key: amount
+                for key, amount in amounts.items()
+                if key not in current
+            },
+            recipe,
+        )
+        ShoppingCartIngredient.objects.change_recipe(
+            recipe, old_amounts, amounts
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop("ingredients")
-        tags_data = self.initial_data.get("tags")
+        tags_data = validated_data.pop("tags")
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags_data)
         self.create_ingredients(ingredients_data, recipe)
+        transaction.on_commit(partial(schedule_image_processing, recipe.id))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.image = validated_data.get("image", instance.image)
+        """Сохраняет только поля из запроса.
+
+        Объект загружен в начале запроса: полное сохранение вернуло бы
+        старые имена картинок, если фоновая обработка успела их заменить.
+        """
         instance.name = validated_data.get("name", instance.name)
         instance.text = validated_data.get("text", instance.text)
         instance.cooking_time = validated_data.get(
             "cooking_time", instance.cooking_time
         )
-        instance.tags.clear()
-        tags_data = self.initial_data.get("tags")
-        instance.tags.set(tags_data)
-        RecipeIngredient.objects.filter(recipe=instance).all().delete()
-        self.create_ingredients(validated_data.get("ingredients"), instance)
-        instance.save()
+        update_fields = ["name", "text", "cooking_time", "updated_at"]
+        if "image" in validated_data:
+            instance.image = validated_data["image"]
+            instance.image_status = Recipe.ImageStatus.PENDING
+            update_fields += ["image", "image_status"]
+            transaction.on_commit(
+                partial(schedule_image_processing, instance.id)
+            )
+        instance.tags.set(validated_data["tags"])
+        self.update_ingredients(validated_data["ingredients"], instance)
+        instance.save(update_fields=update_fields)
         return instance
@@ -1,50 +1,146 @@
 import base64
-import io
+import csv
+import json
 from datetime import datetime as dt
 
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from rest_framework import serializers
 
+from config.prometheus import IMAGE_UPLOAD_BYTES, SHOPPING_LIST_EXPORT_BYTES
+
 
 class Base64ImageField(serializers.ImageField):
-    """Класс для преобразования картинки."""
+    """Класс для преобразования картинки.
+
+    Размер проверяется по длине base64-строки до декодирования. Файл
+    сохраняется как есть, пережимается он в фоне (recipes.images).
+    """
+
+    default_error_messages = {
+        "too_large": "Размер изображения не должен превышать {max_size} МБ.",
+    }
+
+    def fail_too_large(self):
+        self.fail(
+            "too_large",
+            max_size=round(settings.RECIPE_IMAGE_MAX_SIZE / 1024 / 1024, 1),
+        )
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
             format, imgstr = data.split(";base64,")
             ext = format.split("/")[-1]
+            if len(imgstr) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                self.fail_too_large()
 
             data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+        elif getattr(data, "size", 0) > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail_too_large()
+        if hasattr(data, "size"):
+            IMAGE_UPLOAD_BYTES.observe(data.size)
 
         return super().to_internal_value(data)
 
 
-def out_list_ingredients(self, request, ingredients):
-    user = self.request.user
-    filename = f"{user.username}_shopping_list.txt"
+SHOPPING_LIST_CHUNK_SIZE = 500
 
-    today = dt.today()
-    shopping_list = io.StringIO()
-    shopping_list.write(
-        f"Список покупок для пользователя: {user.username}\n\n"
-    )
-    shopping_list.write(f"Дата: {today:%Y-%m-%d}\n\n")
-    shopping_list.write(
-        "\n".join(
-            [
-                f'- {ingredient["ingredient__name"]} '
-                f'({ingredient["ingredient__measurement_unit"]})'
-                f' - {ingredient["amount"]}'
-                for ingredient in ingredients
-            ]
+SHOPPING_LIST_FORMATS = {
+    "txt": "text/plain; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(user, ingredients, today):
+    yield f"Список покупок для пользователя: {user.username}\n\n"
+    yield f"Дата: {today:%Y-%m-%d}\n\n"
+    separator = ""
+    for ingredient in ingredients:
+        yield (
+            f"{separator}- {ingredient['ingredient__name']} "
+            f"({ingredient['ingredient__measurement_unit']})"
+            f" - {ingredient['amount']}"
+        )
+        separator = "\n"
+    yield f"\n\nFoodgram ({today:%Y})"
+
+
+def shopping_list_csv(user, ingredients, today):
+    writer = csv.writer(Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for ingredient in ingredients:
+        yield writer.writerow(
+            (
+                ingredient["ingredient__name"],
+                ingredient["ingredient__measurement_unit"],
+                ingredient["amount"],
+            )
         )
+
+
+def shopping_list_json(user, ingredients, today):
+    username = json.dumps(user.username, ensure_ascii=False)
+    yield (
+        f'{{"user": {username}, "date": "{today:%Y-%m-%d}", '
+        '"ingredients": ['
     )
-    shopping_list.write(f"\n\nFoodgram ({today:%Y})")
+    separator = ""
+    for ingredient in ingredients:
+        yield separator + json.dumps(
+            {
+                "name": ingredient["ingredient__name"],
+                "measurement_unit": ingredient[
+                    "ingredient__measurement_unit"
+                ],
+                "amount": ingredient["amount"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ", "
+    yield "]}"
+
+
+SHOPPING_LIST_WRITERS = {
+    "txt": shopping_list_txt,
+    "csv": shopping_list_csv,
+    "json": shopping_list_json,
+}
 
-    response = HttpResponse(
-        shopping_list.getvalue().encode("utf-8"),
-        content_type="text/plain; charset=utf-8",
+
+def measure_export(content, file_format):
+    """Передает части выгрузки дальше и в конце учитывает ее размер."""
+    size = 0
+    for chunk in content:
+        size += len(chunk)
+        yield chunk
+    SHOPPING_LIST_EXPORT_BYTES.labels(file_format).observe(size)
+
+
+def out_list_ingredients(user, ingredients, file_format="txt"):
+    """Потоковая выгрузка списка покупок в формате txt, csv или json.
+
+    Строки читаются из базы серверным курсором порциями, поэтому память
+    не зависит от размера корзины, а первые байты уходят клиенту сразу.
+    """
+    today = dt.today()
+    rows = ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+    content = (
+        chunk.encode("utf-8")
+        for chunk in SHOPPING_LIST_WRITERS[file_format](user, rows, today)
+    )
+    response = StreamingHttpResponse(
+        measure_export(content, file_format),
+        content_type=SHOPPING_LIST_FORMATS[file_format],
     )
+    filename = f"{user.username}_shopping_list.{file_format}"
     response["Content-Disposition"] = f"attachment; filename={filename}"
     return response
@@ -1,5 +1,11 @@
+import copy
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
@@ -7,21 +13,44 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from config.metrics import SerializeTimingMixin
+from config.prometheus import record_cache
 from recipes.models import (
     FavoriteRecipe,
     Recipe,
     RecipeIngredient,
+    ShoppingCartIngredient,
     ShoppingList,
 )
+from recipes.versions import (
+    datetime_version,
+    get_catalog_version,
+    get_content_version,
+    get_viewer_version,
+)
+from users.models import Follow
+
+from api.cache import (
+    ConditionalGetMixin,
+    make_validators,
+    response_cache_key,
+)
+from api.loaders import ViewerState
 from api.permissions import IsOwnerOrReadOnly
 from .filters import RecipeFilter
-from .serializers import FavoriteShoppingSerializer, RecipeSerializer
-from .utils import out_list_ingredients
+from .serializers import (
+    FavoriteShoppingSerializer,
+    RecipeBatchSerializer,
+    RecipeSerializer,
+)
+from .utils import SHOPPING_LIST_FORMATS, out_list_ingredients
 
 User = get_user_model()
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(
+    SerializeTimingMixin, ConditionalGetMixin, ModelViewSet
+):
     """Вьюсет для рецептов."""
 
     queryset = Recipe.objects.all()
@@ -29,12 +58,176 @@ class RecipeViewSet(ModelViewSet):
     permission_classes = (IsOwnerOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    viewer_filters = ("is_favorited", "is_in_shopping_cart")
+    conditional_vary = ("Authorization", "Cookie")
+    cursor_ordering = ("-pub_date", "-id")
+
+    def get_queryset(self):
+        """Queryset под RecipeSerializer с фиксированным числом запросов.
+
+        Автор, теги и ингредиенты подгружаются пачкой на всю страницу,
+        а флаги текущего пользователя считаются подзапросами Exists().
+        """
+        user = self.request.user
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(
+                    Follow.objects.filter(user=user, follower=OuterRef("pk"))
+                )
+            )
+            is_favorited = Exists(
+                FavoriteRecipe.objects.filter(user=user, recipe=OuterRef("pk"))
+            )
+            is_in_shopping_cart = Exists(
+                ShoppingList.objects.filter(user=user, recipe=OuterRef("pk"))
+            )
+        else:
+            authors = authors.annotate(is_subscribed=Value(False))
+            is_favorited = is_in_shopping_cart = Value(False)
+        return (
+            super()
+            .get_queryset()
+            .prefetch_related(
+                Prefetch("author", queryset=authors),
+                "tags",
+                Prefetch(
+                    "recipeingredient_set",
+                    queryset=RecipeIngredient.objects.select_related(
+                        "ingredient"
+                    ),
+                ),
+            )
+            .annotate(
+                is_favorited=is_favorited,
+                is_in_shopping_cart=is_in_shopping_cart,
+            )
+        )
+
+    @staticmethod
+    def response_items(data):
+        return data.get("results", [data]) if isinstance(data, dict) else data
+
+    @classmethod
+    def prime_viewer_state(cls, data, state):
+        """Накапливает в state id рецептов и авторов из ответа."""
+        items = cls.response_items(data)
+        recipe_ids = [item["id"] for item in items]
+        state.prime("favorites", recipe_ids)
+        state.prime("shopping_cart", recipe_ids)
+        state.prime("following", (item["author"]["id"] for item in items))
+
+    @classmethod
+    def set_viewer_flags(cls, data, state):
+        """Проставляет в готовый ответ флаги пользователя или False."""
+        items = cls.response_items(data)
+        if state is not None:
+            cls.prime_viewer_state(data, state)
+        for item in items:
+            item["is_favorited"] = state is not None and state.contains(
+                "favorites", item["id"]
+            )
+            item["is_in_shopping_cart"] = state is not None and state.contains(
+                "shopping_cart", item["id"]
+            )
+            item["author"]["is_subscribed"] = (
+                state is not None
+                and state.contains("following", item["author"]["id"])
+            )
+
+    def cached_response(self, build, request, *args, **kwargs):
+        """Отдает список или рецепт из кэша, общего для всех пользователей.
+
+        В кэше хранится ответ без флагов пользователя, ключ включает
+        версию содержимого, которую сигналы меняют при любой правке.
+        Для авторизованных флаги накладываются поверх кэша, фильтры по
+        избранному и корзине кэш не используют.
+        """
+        if any(request.query_params.get(name) for name in self.viewer_filters):
+            return build(request, *args, **kwargs)
+        key = response_cache_key(request, "recipes")
+        data = cache.get(key)
+        record_cache("response", data is not None)
+        if data is None:
+            response = build(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                data = copy.deepcopy(response.data)
+                self.set_viewer_flags(data, None)
+                cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+        if request.user.is_authenticated:
+            self.set_viewer_flags(data, ViewerState.for_request(request))
+        return Response(data)
+
+    def get_validators(self, request, *args, **kwargs):
+        """Список валидируется версией содержимого, рецепт — updated_at.
+
+        Дата изменения рецепта обновляется и при правке его автора, а
+        теги и ингредиенты учитываются версией справочников. Флаги
+        пользователя в ответе покрываются его собственной версией.
+        """
+        versions = []
+        user_id = None
+        if request.user.is_authenticated:
+            user_id = request.user.pk
+            versions.append(get_viewer_version(user_id))
+        if self.action == "list":
+            versions.append(get_content_version())
+        else:
+            try:
+                updated_at = (
+                    Recipe.objects.filter(pk=kwargs[self.lookup_field])
+                    .values_list("updated_at", flat=True)
+                    .first()
+                )
+            except (TypeError, ValueError):
+                # Нечисловой id: 404 вернет get_object_or_404 в retrieve.
+                return None
+            if updated_at is None:
+                return None
+            versions += [get_catalog_version(), datetime_version(updated_at)]
+        return make_validators(versions, user_id)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            partial(self.cached_response, super().list),
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            partial(self.cached_response, super().retrieve),
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def perform_content_negotiation(self, request, force=False):
+        # В download_shopping_cart параметр format выбирает формат файла,
+        # а не рендерер DRF, поэтому неизвестный рендереру формат не 404.
+        force = force or self.action == "download_shopping_cart"
+        return super().perform_content_negotiation(request, force=force)
+
+    def reload_instance(self, serializer):
+        # Ответ после записи собирается тем же запросом, что и список.
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
 
     def perform_create(self, serializer):
-        return serializer.save(author=self.request.user)
+        serializer.save(author=self.request.user)
+        self.reload_instance(serializer)
 
     def perform_update(self, serializer):
-        return serializer.save(author=self.request.user)
+        serializer.save(author=self.request.user)
+        self.reload_instance(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingCartIngredient.objects.remove_recipe_for_all(instance)
+        instance.delete()
 
     @action(
         detail=True,
@@ -78,9 +271,12 @@ class RecipeViewSet(ModelViewSet):
     def shopping_cart(self, request, pk=None):
         user = request.user
         recipe = self.get_object()
-        add_to_shopping_list, created = ShoppingList.objects.get_or_create(
-            user=user, recipe=recipe
-        )
+        with transaction.atomic():
+            add_to_shopping_list, created = ShoppingList.objects.get_or_create(
+                user=user, recipe=recipe
+            )
+            if created:
+                ShoppingCartIngredient.objects.add_recipe(user, recipe)
         if created:
             serializer = FavoriteShoppingSerializer(add_to_shopping_list)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -100,21 +296,119 @@ class RecipeViewSet(ModelViewSet):
                 {"detail": "Рецепт не найден в корзине."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        shopping_list.delete()
+        with transaction.atomic():
+            shopping_list.delete()
+            ShoppingCartIngredient.objects.remove_recipe(user, recipe)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def batch_change(self, request, model):
+        """Добавляет или удаляет пачку рецептов в одной транзакции.
+
+        Ответ содержит статус по каждому id: added/exists при POST,
+        removed/missing при DELETE и not_found для несуществующих.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+        user = request.user
+        with transaction.atomic():
+            found = set(
+                Recipe.objects.filter(pk__in=recipe_ids).values_list(
+                    "id", flat=True
+                )
+            )
+            recipe_ids = [pk for pk in recipe_ids if pk in found]
+            if request.method == "POST":
+                changed = model.objects.add_many(user, recipe_ids)
+                if model is ShoppingList:
+                    ShoppingCartIngredient.objects.add_recipes(user, changed)
+                statuses = ("added", "exists")
+            else:
+                changed = model.objects.remove_many(user, recipe_ids)
+                if model is ShoppingList:
+                    ShoppingCartIngredient.objects.remove_recipes(
+                        user, changed
+                    )
+                statuses = ("removed", "missing")
+        changed = set(changed)
+        return Response(
+            {
+                "results": [
+                    {
+                        "id": pk,
+                        "status": (
+                            statuses[pk not in changed]
+                            if pk in found
+                            else "not_found"
+                        ),
+                    }
+                    for pk in serializer.validated_data["recipes"]
+                ]
+            }
+        )
+
+    @action(
+        detail=False,
+        methods=["POST", "DELETE"],
+        permission_classes=(IsAuthenticated,),
+        url_path="favorite/batch",
+    )
+    def favorite_batch(self, request):
+        return self.batch_change(request, FavoriteRecipe)
+
+    @action(
+        detail=False,
+        methods=["POST", "DELETE"],
+        permission_classes=(IsAuthenticated,),
+        url_path="shopping_cart/batch",
+    )
+    def shopping_cart_batch(self, request):
+        return self.batch_change(request, ShoppingList)
+
+    def ranked_list(self, request, score):
+        """Рецепты по предрассчитанному рейтингу с фильтрами списка."""
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(**{f"ranking__{score}__gt": 0})
+            .order_by(f"-ranking__{score}", "-id")
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["GET"], cursor_ordering=None)
+    def popular(self, request):
+        return self.ranked_list(request, "popular_score")
+
+    @action(detail=False, methods=["GET"], cursor_ordering=None)
+    def trending(self, request):
+        return self.ranked_list(request, "trending_score")
+
     @action(
         detail=False,
         methods=["GET"],
         permission_classes=(IsAuthenticated,),
     )
     def download_shopping_cart(self, request):
+        file_format = request.query_params.get("format", "txt")
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {
+                    "format": (
+                        "Доступные форматы: "
+                        f"{', '.join(SHOPPING_LIST_FORMATS)}."
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_list__user=self.request.user
+            ShoppingCartIngredient.objects.filter(user=request.user)
+            .values(
+                "ingredient__name", "ingredient__measurement_unit", "amount"
             )
-            .values("ingredient__name", "ingredient__measurement_unit")
             .order_by("ingredient__name")
-            .annotate(amount=Sum("amount"))
         )
-        return out_list_ingredients(self, request, ingredients)
+        return out_list_ingredients(request.user, ingredients, file_format)
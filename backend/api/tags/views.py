@@ -1,14 +1,28 @@
 from rest_framework.permissions import AllowAny
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from config.metrics import SerializeTimingMixin
 from recipes.models import Tag
+from api.cache import CatalogConditionalMixin
 from .serializers import TagSerializer
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(
+    SerializeTimingMixin, CatalogConditionalMixin, ReadOnlyModelViewSet
+):
     """Вьюсет для отображения тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
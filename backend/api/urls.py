@@ -1,8 +1,15 @@
+from django.conf import settings
 from django.urls import include, path
 
 urlpatterns = [
     path("", include("api.ingredients.urls")),
+    path("", include("api.metrics.urls")),
     path("", include("api.recipe.urls")),
     path("", include("api.tags.urls")),
     path("", include("api.users.urls")),
 ]
+
+if settings.ASYNC_VIEWS:
+    # Под ASGI чтение рецептов, справочников и подписок перехватывают
+    # async-представления, остальные маршруты остаются синхронными.
+    urlpatterns.insert(0, path("", include("api.async_urls")))
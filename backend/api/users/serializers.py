@@ -1,14 +1,33 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 
 from recipes.models import Recipe
-from users.models import Follow
+from api.loaders import ViewerStateListSerializer, viewer_has
 
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса, ограниченное RECIPES_LIMIT_MAX."""
+    value = request.query_params.get("recipes_limit")
+    if value in (None, ""):
+        return settings.RECIPES_LIMIT_MAX
+    try:
+        limit = int(value)
+    except ValueError:
+        raise serializers.ValidationError(
+            {"recipes_limit": "Должно быть целым числом."}
+        )
+    if limit < 0:
+        raise serializers.ValidationError(
+            {"recipes_limit": "Не может быть отрицательным."}
+        )
+    return min(limit, settings.RECIPES_LIMIT_MAX)
+
+
 class RecipeLightSerializer(serializers.ModelSerializer):
     """Упрощенный сериализатор для рецептов при отписке/подписке."""
 
@@ -18,6 +37,9 @@ class RecipeLightSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "image",
+            "image_card",
+            "image_thumbnail",
+            "image_status",
             "cooking_time",
         )
 
@@ -39,14 +61,15 @@ class UserSerializer(serializers.ModelSerializer):
             "is_subscribed",
         )
         model = User
+        list_serializer_class = ViewerStateListSerializer
+
+    def prime_viewer_state(self, state, users):
+        state.prime("following", (user.id for user in users))
 
     def get_is_subscribed(self, obj):
-        request = self.context.get("request", None)
-        if request and request.user.is_authenticated:
-            return Follow.objects.filter(
-                user=request.user, follower=obj
-            ).exists()
-        return False
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
+        return viewer_has(self.context, "following", obj.id)
 
     def validate_password(self, value):
         validate_password(value, self.instance)
@@ -79,7 +102,7 @@ class SubscriptionSerializer(UserSerializer):
     """Сериализатор для подписки/отписки пользователей."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + (
@@ -88,18 +111,12 @@ class SubscriptionSerializer(UserSerializer):
         )
 
     def get_recipes(self, obj):
-        recipes_limit = self.context["request"].query_params.get(
-            "recipes_limit"
-        )
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            limit = int(recipes_limit)
-            recipes = recipes[:limit]
+        recipes = getattr(obj, "recipes_preview", None)
+        if recipes is None:
+            limit = get_recipes_limit(self.context["request"])
+            recipes = obj.recipes.all()[:limit]
         return RecipeLightSerializer(recipes, many=True, read_only=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def to_representation(self, instance):
         data = super(UserSerializer, self).to_representation(instance)
         return data
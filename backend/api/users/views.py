@@ -1,12 +1,19 @@
 from django.contrib.auth import get_user_model
+from django.db.models import F, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from config.metrics import SerializeTimingMixin
+from recipes.models import Recipe
+from recipes.versions import get_content_version, get_viewer_version
 from users.models import Follow
-from .serializers import SubscriptionSerializer
+
+from api.cache import ConditionalGetMixin, make_validators
+from .serializers import SubscriptionSerializer, get_recipes_limit
 
 User = get_user_model()
 
@@ -68,12 +75,58 @@ class SubscribeViewSet(APIView):
             )
 
 
-class SubscribeListView(ListAPIView):
+class SubscribeListView(
+    SerializeTimingMixin, ConditionalGetMixin, ListAPIView
+):
     """ListAPIView для подписок пользователей."""
 
     serializer_class = SubscriptionSerializer
     permission_classes = (IsAuthenticated,)
+    cursor_ordering = ("username",)
+    count_per_user = True
+    conditional_vary = ("Authorization",)
+
+    def get_validators(self, request, *args, **kwargs):
+        """Подписки валидируются версиями пользователя и содержимого.
+
+        Подписка и отписка меняют версию пользователя, а авторы и превью
+        их рецептов покрываются версией содержимого.
+        """
+        user_id = request.user.pk
+        return make_validators(
+            (get_viewer_version(user_id), get_content_version()), user_id
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
 
     def get_queryset(self):
+        """Авторы страницы с числом рецептов и первыми N рецептами.
+
+        Превью всех авторов страницы выбирается одним запросом с
+        ROW_NUMBER() OVER (PARTITION BY author).
+        """
         user = self.request.user
-        return User.objects.filter(follower__user=user)
+        previews = (
+            Recipe.objects.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=(F("pub_date").desc(), F("id").desc()),
+                )
+            )
+            .filter(row_number__lte=get_recipes_limit(self.request))
+            .order_by("-pub_date", "-id")
+        )
+        return (
+            User.objects.filter(follower__user=user)
+            .annotate(is_subscribed=Value(True))
+            .prefetch_related(
+                Prefetch(
+                    "recipes", queryset=previews, to_attr="recipes_preview"
+                )
+            )
+            .order_by("username")
+        )
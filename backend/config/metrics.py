@@ -0,0 +1,213 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Верхние границы корзин гистограммы времени ответа в миллисекундах,
+# последняя корзина — все, что дольше.
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+current_metrics = ContextVar("current_metrics", default=None)
+# Список времен подключения к базе за запрос для ConnectTimingMiddleware.
+# Под ASGI соединения открываются в потоках sync_to_async, куда contextvar
+# переходит вместе с запросом.
+connect_timings = ContextVar("connect_timings", default=None)
+
+
+class ConnectionHook:
+    """Execute-обертка на всех соединениях с базой процесса.
+
+    Под ASGI синхронные представления и async ORM работают в потоках
+    sync_to_async со своими соединениями. Поэтому обертка ставится на
+    каждое соединение при подключении, а на открытые раньше — по сигналу
+    request_started, который ASGIHandler отправляет в том же потоке, где
+    выполняется ORM. Обертку текущего запроса хук берет из contextvar,
+    который переходит в эти потоки вместе с запросом.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        connection_created.connect(self.connection_created)
+        request_started.connect(self.request_started)
+        self.request_started(None)
+
+    def __call__(self, execute, sql, params, many, context):
+        wrapper = self.context.get()
+        if wrapper is None:
+            return execute(sql, params, many, context)
+        return wrapper(execute, sql, params, many, context)
+
+    def install(self, connection):
+        if self not in connection.execute_wrappers:
+            # В начало списка: execute_wrapper() снимает обертки с конца.
+            connection.execute_wrappers.insert(0, self)
+
+    def connection_created(self, sender, connection, **kwargs):
+        self.install(connection)
+
+    def request_started(self, sender, **kwargs):
+        for connection in connections.all(initialized_only=True):
+            self.install(connection)
+
+
+class RequestMetrics:
+    """Счетчики одного запроса: SQL-запросы и время сериализации.
+
+    Объект лежит в contextvar, поэтому виден и в потоке, где под ASGI
+    выполняется синхронное представление.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        # Сколько соединений с базой открыто за время запроса.
+        self.connections = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper()."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+sql_metrics = ConnectionHook(current_metrics)
+
+
+def timed_serialization(to_representation):
+    """Учитывает время to_representation в метриках текущего запроса."""
+
+    def wrapper(instance):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return to_representation(instance)
+        started = time.perf_counter()
+        try:
+            return to_representation(instance)
+        finally:
+            metrics.serialize_time += time.perf_counter() - started
+
+    return wrapper
+
+
+class SerializeTimingMixin:
+    """Время сериализации ответа для метрик запроса.
+
+    Оборачивается to_representation только сериализатора из
+    get_serializer(), поэтому вложенные сериализаторы не учитываются
+    повторно, а классы DRF не меняются.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.to_representation = timed_serialization(
+            serializer.to_representation
+        )
+        return serializer
+
+
+def route_name(request):
+    """Имя маршрута для гистограмм.
+
+    Для DRF — класс представления и действие, например RecipeViewSet.list,
+    для остальных представлений — имя URL.
+    """
+    match = request.resolver_match
+    if match is None:
+        return "unresolved"
+    view_class = getattr(match.func, "cls", None)
+    if view_class is None:
+        return match.view_name or match._func_path
+    method = request.method.lower()
+    actions = getattr(match.func, "actions", None) or {}
+    return f"{view_class.__name__}.{actions.get(method, method)}"
+
+
+def bucket_percentile(buckets, percent):
+    """Верхняя граница корзины, в которую попадает перцентиль."""
+    total = sum(buckets)
+    if not total:
+        return None
+    threshold = total * percent / 100
+    seen = 0
+    for bound, count in zip(DURATION_BUCKETS, buckets):
+        seen += count
+        if seen >= threshold:
+            return bound
+    return None
+
+
+class RouteHistograms:
+    """Гистограммы времени ответа и суммы счетчиков по маршрутам.
+
+    Хранятся в памяти процесса с момента запуска или последнего reset().
+    """
+
+    SUMS = (
+        "duration_ms",
+        "sql_count",
+        "sql_ms",
+        "serialize_ms",
+        "response_bytes",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, record):
+        with self._lock:
+            stats = self._routes.get(record["route"])
+            if stats is None:
+                stats = self._routes[record["route"]] = {
+                    "count": 0,
+                    "errors": 0,
+                    "duration_ms_max": 0.0,
+                    "buckets": [0] * (len(DURATION_BUCKETS) + 1),
+                    **{f"{name}_sum": 0 for name in self.SUMS},
+                }
+            stats["count"] += 1
+            stats["errors"] += record["status"] >= 500
+            stats["duration_ms_max"] = max(
+                stats["duration_ms_max"], record["duration_ms"]
+            )
+            stats["buckets"][
+                bisect_left(DURATION_BUCKETS, record["duration_ms"])
+            ] += 1
+            for name in self.SUMS:
+                stats[f"{name}_sum"] += record[name] or 0
+
+    def snapshot(self):
+        """Копия статистики с средними и оценкой p50/p95 по корзинам."""
+        with self._lock:
+            routes = {
+                route: {**stats, "buckets": list(stats["buckets"])}
+                for route, stats in self._routes.items()
+            }
+        for stats in routes.values():
+            for name in self.SUMS:
+                stats[f"{name}_avg"] = round(
+                    stats[f"{name}_sum"] / stats["count"], 2
+                )
+            stats["p50_ms"] = bucket_percentile(stats["buckets"], 50)
+            stats["p95_ms"] = bucket_percentile(stats["buckets"], 95)
+        return routes
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+
+request_histograms = RouteHistograms()
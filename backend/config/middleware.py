@@ -0,0 +1,221 @@
+import json
+import logging
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import (
+    RequestMetrics,
+    connect_timings,
+    current_metrics,
+    request_histograms,
+    route_name,
+)
+from .prometheus import QUERY_PROBLEMS, observe_request
+from .queries import (
+    QueryInspector,
+    QueryProblemsError,
+    current_inspector,
+    format_findings,
+)
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger("config.requests")
+query_logger = logging.getLogger("config.queries")
+
+
+def add_server_timing(response, timing):
+    if response.has_header("Server-Timing"):
+        timing = f"{response['Server-Timing']}, {timing}"
+    response["Server-Timing"] = timing
+
+
+class ConnectTimingMiddleware:
+    """Добавляет в ответ время установки соединений с базой.
+
+    Значение уходит в заголовок Server-Timing (db-connect) и в лог.
+    Нулевое время означает, что запрос обошелся открытым соединением
+    или вовсе не ходил в базу. Middleware работает и под ASGI, не
+    переводя async-представления в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = []
+        token = connect_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            connect_timings.reset(token)
+        return self.add_timing(request, response, sum(timings))
+
+    async def __acall__(self, request):
+        timings = []
+        token = connect_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            connect_timings.reset(token)
+        return self.add_timing(request, response, sum(timings))
+
+    def add_timing(self, request, response, elapsed):
+        if elapsed:
+            logger.debug(
+                "Подключение к базе для %s: %.1f мс",
+                request.path,
+                elapsed * 1000,
+            )
+        add_server_timing(response, f"db-connect;dur={elapsed * 1000:.1f}")
+        return response
+
+
+class RequestMetricsMiddleware:
+    """Метрики запроса: время, SQL, сериализация и размер ответа.
+
+    Для каждого запроса пишет строку JSON в лог config.requests,
+    добавляет в Server-Timing app, db и serialize и копит гистограммы по
+    маршрутам в request_histograms и метриках Prometheus. SQL считает
+    sql_metrics на каждом соединении, в том числе в потоках под ASGI,
+    сериализацию — представления с SerializeTimingMixin.
+    Стоит первым в MIDDLEWARE, чтобы учитывать остальные middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.record(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.record(request, response, metrics)
+
+    def response_size(self, response):
+        if response.streaming:
+            return int(response.get("Content-Length", 0)) or None
+        return len(response.content)
+
+    def record(self, request, response, metrics):
+        record = {
+            "route": route_name(request),
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(metrics.elapsed * 1000, 2),
+            "sql_count": metrics.sql_count,
+            "sql_ms": round(metrics.sql_time * 1000, 2),
+            "serialize_ms": round(metrics.serialize_time * 1000, 2),
+            "response_bytes": self.response_size(response),
+        }
+        request_histograms.observe(record)
+        observe_request(record, metrics)
+        request_logger.info(json.dumps(record, ensure_ascii=False))
+        add_server_timing(
+            response,
+            f"app;dur={record['duration_ms']}, "
+            f'db;dur={record["sql_ms"]};desc="{metrics.sql_count} queries", '
+            f"serialize;dur={record['serialize_ms']}",
+        )
+        return response
+
+
+class QueryInspectorMiddleware:
+    """Ищет N+1 и медленные SQL-запросы в запросах к API.
+
+    Запросы одного шаблона, повторенные больше QUERY_REPEAT_THRESHOLD
+    раз, и запросы дольше QUERY_SLOW_MS попадают в находки со стеком
+    вызова. В режиме raise (по умолчанию в тестах) находки превращаются в
+    QueryProblemsError и роняют тест, в режиме log проверяется доля
+    QUERY_INSPECTOR_SAMPLE_RATE запросов, а находки пишутся в лог
+    config.queries.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inspector = self.get_inspector()
+        if inspector is None:
+            return self.get_response(request)
+        token = current_inspector.set(inspector)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_inspector.reset(token)
+        self.report(request, inspector)
+        return response
+
+    async def __acall__(self, request):
+        inspector = self.get_inspector()
+        if inspector is None:
+            return await self.get_response(request)
+        token = current_inspector.set(inspector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_inspector.reset(token)
+        self.report(request, inspector)
+        return response
+
+    def get_inspector(self):
+        mode = settings.QUERY_INSPECTOR_MODE
+        if mode == "off" or (
+            mode == "log"
+            and random.random() >= settings.QUERY_INSPECTOR_SAMPLE_RATE
+        ):
+            return None
+        return QueryInspector(
+            settings.QUERY_REPEAT_THRESHOLD, settings.QUERY_SLOW_MS
+        )
+
+    def report(self, request, inspector):
+        findings = inspector.findings()
+        if not findings:
+            return
+        route = route_name(request)
+        for finding in findings:
+            QUERY_PROBLEMS.labels(route, finding["kind"]).inc()
+        if settings.QUERY_INSPECTOR_MODE == "raise":
+            raise QueryProblemsError(format_findings(route, findings))
+        for finding in findings:
+            query_logger.warning(
+                json.dumps(
+                    {"route": route, "path": request.path, **finding},
+                    ensure_ascii=False,
+                )
+            )
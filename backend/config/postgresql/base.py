@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+import time
+from functools import partial
+
+from django.db.backends.postgresql import base
+from django.db.utils import OperationalError
+from psycopg2 import extensions
+
+from config.metrics import connect_timings
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Пул соединений psycopg2 внутри одного процесса.
+
+    Нужен потоковым и асинхронным воркерам: соединение берется из пула
+    при первом запросе к базе и возвращается в него, когда Django
+    закрывает соединение в конце запроса.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+
+    def acquire(self, connect, health_check=False):
+        """Возвращает (соединение, взято ли оно из пула).
+
+        Django считает соединение из connect() проверенным и не применяет
+        к нему CONN_HEALTH_CHECKS, поэтому с health_check соединение из
+        пула проверяется здесь. Мертвые соединения, например после
+        перезапуска Postgres, закрываются.
+        """
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError("Нет свободных соединений в пуле.")
+        try:
+            while True:
+                try:
+                    connection = self.idle.get_nowait()
+                except queue.Empty:
+                    return connect(), False
+                if not connection.closed and (
+                    not health_check or self.is_usable(connection)
+                ):
+                    return connection, True
+                connection.close()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            # Без autocommit проверка открыла транзакцию, а в ней Django не
+            # сможет включить autocommit на выданном соединении.
+            status = connection.info.transaction_status
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except base.Database.Error:
+            return False
+        return True
+
+    def release(self, connection):
+        try:
+            if connection.closed:
+                return
+            status = connection.info.transaction_status
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            self.idle.put(connection)
+        except base.Database.Error:
+            connection.close()
+        finally:
+            self.slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с замером времени подключения и пулом соединений.
+
+    Время установки соединения попадает в connect_timings текущего
+    запроса, его отдает ConnectTimingMiddleware. Пул включается ключом
+    POOL_MAX_SIZE в настройках базы.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connection_source = "new"
+
+    @property
+    def pool(self):
+        size = self.settings_dict.get("POOL_MAX_SIZE")
+        if not size:
+            return None
+        # Пул принадлежит процессу: после fork соединения не делятся.
+        key = (os.getpid(), self.alias)
+        with pools_lock:
+            if key not in pools:
+                pools[key] = ConnectionPool(
+                    size, self.settings_dict.get("POOL_TIMEOUT", 5)
+                )
+            return pools[key]
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            timings = connect_timings.get()
+            if timings is not None:
+                timings.append(time.perf_counter() - start)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        connect = partial(super().get_new_connection, conn_params)
+        if pool is None:
+            self.connection_source = "new"
+            return connect()
+        connection, pooled = pool.acquire(
+            connect, self.settings_dict["CONN_HEALTH_CHECKS"]
+        )
+        # Источник попадает в метрики через сигнал connection_created.
+        self.connection_source = "pool" if pooled else "new"
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection)
@@ -0,0 +1,114 @@
+import os
+
+from django.db.backends.signals import connection_created
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    multiprocess,
+)
+
+from .metrics import DURATION_BUCKETS, current_metrics
+
+# В gunicorn с несколькими воркерами каждый процесс пишет значения в свои
+# mmap-файлы в PROMETHEUS_MULTIPROC_DIR, а при выгрузке они суммируются.
+# Переменная должна быть задана до импорта prometheus_client.
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+if os.getenv(MULTIPROC_DIR_ENV):
+    # manage.py может импортировать метрики раньше, чем gunicorn создаст
+    # каталог в on_starting.
+    os.makedirs(os.environ[MULTIPROC_DIR_ENV], exist_ok=True)
+
+REQUEST_LABELS = ("route", "method", "status")
+SIZE_BUCKETS = tuple(
+    kilobytes * 1024 for kilobytes in (1, 10, 50, 100, 500, 1024, 5 * 1024)
+)
+
+REQUEST_DURATION = Histogram(
+    "foodgram_http_request_duration_seconds",
+    "Время ответа по маршрутам.",
+    REQUEST_LABELS,
+    buckets=tuple(bound / 1000 for bound in DURATION_BUCKETS),
+)
+REQUEST_QUERIES = Histogram(
+    "foodgram_http_request_db_queries",
+    "Число SQL-запросов на запрос по маршрутам.",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_SECONDS = Counter(
+    "foodgram_http_request_db_seconds",
+    "Время SQL-запросов по маршрутам.",
+    ("route",),
+)
+REQUEST_SERIALIZE_SECONDS = Counter(
+    "foodgram_http_request_serialize_seconds",
+    "Время сериализации по маршрутам.",
+    ("route",),
+)
+DB_CONNECTIONS = Counter(
+    "foodgram_db_connections",
+    "Соединения с базой: new — новое, pool — из пула, persistent — "
+    "оставшееся открытым от прошлого запроса (CONN_MAX_AGE).",
+    ("source",),
+)
+CACHE_REQUESTS = Counter(
+    "foodgram_cache_requests",
+    "Обращения к кэшам приложения.",
+    ("cache", "result"),
+)
+QUERY_PROBLEMS = Counter(
+    "foodgram_query_problems",
+    "Находки QueryInspectorMiddleware: repeated — N+1, slow — медленные.",
+    ("route", "kind"),
+)
+IMAGE_UPLOAD_BYTES = Histogram(
+    "foodgram_recipe_image_upload_bytes",
+    "Размер загруженных изображений рецептов.",
+    buckets=SIZE_BUCKETS,
+)
+SHOPPING_LIST_EXPORT_BYTES = Histogram(
+    "foodgram_shopping_list_export_bytes",
+    "Размер выгрузок списка покупок.",
+    ("format",),
+    buckets=SIZE_BUCKETS,
+)
+
+
+def get_registry():
+    """Реестр для выгрузки: сумма по процессам или метрики процесса."""
+    if not os.getenv(MULTIPROC_DIR_ENV):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def observe_request(record, metrics):
+    """Переносит метрики запроса из RequestMetricsMiddleware."""
+    route = record["route"]
+    REQUEST_DURATION.labels(
+        route, record["method"], record["status"]
+    ).observe(record["duration_ms"] / 1000)
+    REQUEST_QUERIES.labels(route).observe(metrics.sql_count)
+    REQUEST_DB_SECONDS.labels(route).inc(metrics.sql_time)
+    REQUEST_SERIALIZE_SECONDS.labels(route).inc(metrics.serialize_time)
+    if metrics.sql_count and not metrics.connections:
+        DB_CONNECTIONS.labels("persistent").inc()
+
+
+def count_connection(sender, connection, **kwargs):
+    source = getattr(connection, "connection_source", "new")
+    DB_CONNECTIONS.labels(source).inc()
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.connections += 1
+
+
+connection_created.connect(count_connection)
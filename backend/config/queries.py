@@ -0,0 +1,116 @@
+import os
+import re
+import time
+import traceback
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .metrics import ConnectionHook
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"IN \((?:%s|\?)(?:, (?:%s|\?))*\)")
+
+# Кадры стека сторонних пакетов и middleware с метриками из config.
+IGNORED_PATHS = ("site-packages", os.path.dirname(__file__) + os.sep)
+STACK_DEPTH = 8
+
+current_inspector = ContextVar("current_inspector", default=None)
+
+
+class QueryProblemsError(Exception):
+    """Запрос к API выполнил повторяющиеся или медленные SQL-запросы."""
+
+
+def normalize_sql(sql):
+    """Шаблон запроса: литералы и длина списков IN не учитываются."""
+    sql = STRING.sub("?", sql)
+    sql = NUMBER.sub("?", sql)
+    return IN_LIST.sub("IN (...)", sql)
+
+
+def project_stack():
+    """Последние кадры стека из кода проекта, от внешнего к внутреннему."""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        f"{frame.filename}:{frame.lineno} in {frame.name}"
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(base_dir)
+        and not any(path in frame.filename for path in IGNORED_PATHS)
+    ]
+    return frames[-STACK_DEPTH:]
+
+
+class QueryInspector:
+    """Собирает SQL одного запроса по шаблонам для поиска N+1.
+
+    QueryInspectorMiddleware кладет его в current_inspector, запросы
+    получает sql_inspection. Стек сохраняется для первого запроса каждого
+    шаблона и для каждого медленного.
+    """
+
+    def __init__(self, repeat_threshold, slow_ms):
+        self.repeat_threshold = repeat_threshold
+        self.slow_ms = slow_ms
+        self.templates = defaultdict(
+            lambda: {"count": 0, "total_ms": 0.0, "stack": None}
+        )
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            template = self.templates[normalize_sql(sql)]
+            template["count"] += 1
+            template["total_ms"] += duration_ms
+            if template["stack"] is None:
+                template["stack"] = project_stack()
+            if duration_ms > self.slow_ms:
+                self.slow.append(
+                    {
+                        "sql": sql,
+                        "duration_ms": round(duration_ms, 2),
+                        "stack": project_stack(),
+                    }
+                )
+
+    def findings(self):
+        """Повторы шаблона сверх repeat_threshold и медленные запросы."""
+        problems = [
+            {
+                "kind": "repeated",
+                "sql": sql,
+                "count": template["count"],
+                "total_ms": round(template["total_ms"], 2),
+                "stack": template["stack"],
+            }
+            for sql, template in self.templates.items()
+            if template["count"] > self.repeat_threshold
+        ]
+        problems += [{"kind": "slow", **query} for query in self.slow]
+        return problems
+
+
+sql_inspection = ConnectionHook(current_inspector)
+
+
+def format_findings(route, findings):
+    lines = [f"Проблемные SQL-запросы в {route}:"]
+    for finding in findings:
+        if finding["kind"] == "repeated":
+            lines.append(
+                f"- {finding['count']} раз ({finding['total_ms']} мс): "
+                f"{finding['sql']}"
+            )
+        else:
+            lines.append(
+                f"- медленный ({finding['duration_ms']} мс): "
+                f"{finding['sql']}"
+            )
+        lines += [f"    {frame}" for frame in finding["stack"]]
+    return "\n".join(lines)
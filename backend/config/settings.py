@@ -36,9 +36,13 @@ INSTALLED_APPS = [
     "django_filters",
     "users.apps.UsersConfig",
     "recipes.apps.RecipesConfig",
+    "api.apps.ApiConfig",
 ]
 
 MIDDLEWARE = [
+    "config.middleware.RequestMetricsMiddleware",
+    "config.middleware.ConnectTimingMiddleware",
+    "config.middleware.QueryInspectorMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -68,21 +72,112 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "config.wsgi.application"
+ASGI_APPLICATION = "config.asgi.application"
 
+# Async-представления для чтения рецептов, справочников и подписок.
+# config.asgi включает их по умолчанию, под WSGI они только добавили бы
+# запуск цикла событий на каждый запрос.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False").lower() == "true"
+
+
+# Пул соединений в процессе (DB_POOL_MAX_SIZE > 0) имеет смысл для
+# потоковых и асинхронных воркеров: соединение возвращается в пул в конце
+# запроса, поэтому CONN_MAX_AGE с пулом по умолчанию 0. Без пула
+# соединения живут DB_CONN_MAX_AGE секунд и проверяются перед запросом.
+# Под ASGI каждый запрос выполняется в своем потоке, и постоянные
+# соединения копились бы по числу потоков, поэтому там тоже 0.
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 0))
 
 DATABASES = {
     "default": {
-        "ENGINE": os.getenv(
-            "DB_ENGINE", "django.db.backends.postgresql_psycopg2"
-        ),
+        "ENGINE": os.getenv("DB_ENGINE", "config.postgresql"),
         "NAME": os.getenv("POSTGRES_DB", "foodgram"),
         "USER": os.getenv("POSTGRES_USER", "foodgram"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("DB_HOST", ""),
         "PORT": os.getenv("DB_PORT", 5432),
+        "CONN_MAX_AGE": int(
+            os.getenv(
+                "DB_CONN_MAX_AGE",
+                0 if DB_POOL_MAX_SIZE or ASYNC_VIEWS else 60,
+            )
+        ),
+        "CONN_HEALTH_CHECKS": (
+            os.getenv("DB_CONN_HEALTH_CHECKS", "True").lower() == "true"
+        ),
+        "POOL_MAX_SIZE": DB_POOL_MAX_SIZE,
+        "POOL_TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", 5)),
+    }
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "/tmp/foodgram_cache"),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 10000)),
+        },
     }
 }
 
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300))
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv("PAGINATION_COUNT_CACHE_TIMEOUT", 60)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv("PAGINATION_COUNT_ESTIMATE_THRESHOLD", 10000)
+)
+
+# Доступ к метрикам Prometheus на /api/metrics/: заголовок
+# Authorization: Bearer <METRICS_TOKEN> или адрес из METRICS_ALLOWED_IPS
+# (адреса и подсети через запятую). Без обоих доступ закрыт. Адреса
+# работают только при прямом подключении к backend:8000, через nginx
+# нужен токен.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [
+    network.strip()
+    for network in os.getenv("METRICS_ALLOWED_IPS", "").split(",")
+    if network.strip()
+]
+
+# Поиск N+1 и медленных SQL-запросов: off, log (в лог пишется доля
+# QUERY_INSPECTOR_SAMPLE_RATE запросов) или raise (ошибка, для тестов).
+TESTING = sys.argv[1:2] == ["test"]
+QUERY_INSPECTOR_MODE = os.getenv(
+    "QUERY_INSPECTOR_MODE", "raise" if TESTING else "log"
+)
+QUERY_INSPECTOR_SAMPLE_RATE = float(
+    os.getenv("QUERY_INSPECTOR_SAMPLE_RATE", 0.01)
+)
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 5))
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", 100))
+
+# Строка JSON с метриками каждого запроса, REQUEST_LOG_LEVEL=WARNING
+# отключает ее.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "config.requests": {
+            "handlers": ["console"],
+            "level": os.getenv("REQUEST_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+        "config.queries": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -114,10 +209,31 @@ STATIC_ROOT = BASE_DIR / "collected_static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv("RECIPE_IMAGE_MAX_SIZE", 5 * 1024 * 1024))
+RECIPE_IMAGE_MAX_DIMENSION = int(os.getenv("RECIPE_IMAGE_MAX_DIMENSION", 1600))
+RECIPE_IMAGE_QUALITY = int(os.getenv("RECIPE_IMAGE_QUALITY", 85))
+RECIPE_IMAGE_WORKERS = int(os.getenv("RECIPE_IMAGE_WORKERS", 2))
+# Через сколько секунд process_images забирает обработку, которую не
+# завершил упавший или перезапущенный воркер.
+RECIPE_IMAGE_PROCESSING_TIMEOUT = int(os.getenv("RECIPE_IMAGE_PROCESSING_TIMEOUT", 600))
+
+# Период полураспада веса добавления в часах и окно трендов в днях.
+RECIPE_TRENDING_HALF_LIFE = float(os.getenv("RECIPE_TRENDING_HALF_LIFE", 48))
+RECIPE_TRENDING_WINDOW = int(os.getenv("RECIPE_TRENDING_WINDOW", 14))
+
 AUTH_USER_MODEL = "users.User"
 
 LIST_PER_PAGE = 6
 
+RECIPES_LIMIT_MAX = int(os.getenv("RECIPES_LIMIT_MAX", 50))
+RECIPES_BATCH_MAX = int(os.getenv("RECIPES_BATCH_MAX", 100))
+
+INGREDIENTS_SEARCH_LIMIT = int(os.getenv("INGREDIENTS_SEARCH_LIMIT", 50))
+INGREDIENTS_INDEX_ENABLED = (
+    os.getenv("INGREDIENTS_INDEX_ENABLED", "True").lower() == "true"
+)
+INGREDIENTS_INDEX_TTL = int(os.getenv("INGREDIENTS_INDEX_TTL", 300))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication",
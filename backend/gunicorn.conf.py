@@ -0,0 +1,43 @@
+import glob
+import os
+
+# Настройки воркеров берутся из окружения. По умолчанию config.wsgi с
+# синхронными воркерами; GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+# запускает config.asgi с async-представлениями для чтения.
+ASGI_WORKER_CLASSES = (
+    "uvicorn.workers.UvicornWorker",
+    "uvicorn.workers.UvicornH11Worker",
+)
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+workers = int(os.getenv("GUNICORN_WORKERS", 1))
+# При threads > 1 синхронный воркер gunicorn заменяет на gthread.
+threads = int(os.getenv("GUNICORN_THREADS", 1))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 2))
+# Перезапуск воркера после N запросов, 0 — без перезапуска.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+wsgi_app = (
+    "config.asgi:application"
+    if worker_class in ASGI_WORKER_CLASSES
+    else "config.wsgi:application"
+)
+
+
+def on_starting(server):
+    # Значения метрик прошлого запуска не должны попасть в новые.
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
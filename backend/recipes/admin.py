@@ -20,17 +20,15 @@ class RecipeIngredientInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     """Отображение модели рецептов в admin панели."""
 
-    list_display = ["name", "author", "get_favorite_count"]
+    list_display = ["name", "author", "favorites_count", "shopping_count"]
     list_filter = ["author", "name", "tags"]
+    list_select_related = ["author"]
     search_fields = ["name", "author__username"]
     inlines = [RecipeIngredientInline]
     filter_horizontal = [
         "tags",
     ]
-
-    @admin.display(description="Добавлен в избранное.")
-    def get_favorite_count(self, obj):
-        return obj.favorites.count()
+    readonly_fields = ["favorites_count", "shopping_count"]
 
 
 @admin.register(Tag)
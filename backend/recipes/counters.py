@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Follow
+from .models import FavoriteRecipe, Recipe, ShoppingList
+
+User = get_user_model()
+
+# (модель со счетчиком, поле счетчика, считаемая модель, ее внешний ключ)
+COUNTERS = (
+    (Recipe, "favorites_count", FavoriteRecipe, "recipe"),
+    (Recipe, "shopping_count", ShoppingList, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Follow, "follower"),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счетчик одним UPDATE, не опускаясь ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def live_count(source, foreign_key):
+    """Подзапрос с реальным числом строк source для OuterRef("pk")."""
+    return Coalesce(
+        Subquery(
+            source.objects.filter(**{foreign_key: OuterRef("pk")})
+            .order_by()
+            .values(foreign_key)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def recount_counters():
+    """Пересчитывает все счетчики, по одному UPDATE на счетчик."""
+    for model, field, source, foreign_key in COUNTERS:
+        model.objects.update(**{field: live_count(source, foreign_key)})
+
+
+def find_counter_mismatches():
+    """Возвращает [(модель, поле, pk, в базе, на самом деле)]."""
+    mismatches = []
+    for model, field, source, foreign_key in COUNTERS:
+        rows = (
+            model.objects.annotate(live=live_count(source, foreign_key))
+            .exclude(**{field: F("live")})
+            .values_list("pk", field, "live")
+        )
+        mismatches += [(model, field, *row) for row in rows]
+    return mismatches
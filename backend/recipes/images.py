@@ -0,0 +1,178 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .versions import bump_content_version
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    "image_card": (600, 600),
+    "image_thumbnail": (300, 300),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def has_alpha(image):
+    return image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def resize_image(file, size, name):
+    """Уменьшает картинку до size и пережимает в JPEG или PNG.
+
+    PNG остается только для картинок с прозрачностью.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        if has_alpha(image):
+            image.save(buffer, "PNG", optimize=True)
+            extension = "png"
+        else:
+            image.convert("RGB").save(
+                buffer,
+                "JPEG",
+                quality=settings.RECIPE_IMAGE_QUALITY,
+                optimize=True,
+                progressive=True,
+            )
+            extension = "jpg"
+    base = os.path.splitext(os.path.basename(name))[0]
+    return ContentFile(buffer.getvalue(), name=f"{base}.{extension}")
+
+
+def process_recipe_image(recipe_id):
+    """Пережимает изображение рецепта и создает уменьшенные копии.
+
+    Рецепт захватывается сменой статуса pending -> processing, поэтому
+    одну картинку не обработают два воркера. Если пока шла обработка
+    картинку заменили, результат выбрасывается. Любая ошибка обработки
+    переводит рецепт в failed.
+    """
+    claimed = Recipe.objects.filter(
+        pk=recipe_id, image_status=Recipe.ImageStatus.PENDING
+    ).update(
+        image_status=Recipe.ImageStatus.PROCESSING,
+        updated_at=timezone.now(),
+    )
+    if not claimed:
+        return False
+    recipe = Recipe.objects.get(pk=recipe_id)
+    try:
+        return save_image_variants(recipe)
+    except Exception:
+        logger.exception(
+            "Не удалось обработать изображение %s", recipe.image.name
+        )
+        failed = Recipe.objects.filter(
+            pk=recipe_id,
+            image=recipe.image.name,
+            image_status=Recipe.ImageStatus.PROCESSING,
+        ).update(
+            image_status=Recipe.ImageStatus.FAILED,
+            updated_at=timezone.now(),
+        )
+        if failed:
+            bump_content_version()
+        return False
+
+
+def save_image_variants(recipe):
+    source_name = recipe.image.name
+    limit = settings.RECIPE_IMAGE_MAX_DIMENSION
+    with recipe.image.open("rb") as source:
+        files = {"image": resize_image(source, (limit, limit), source_name)}
+        for field, size in VARIANTS.items():
+            files[field] = resize_image(source, size, source_name)
+
+    storage = recipe.image.storage
+    names = {
+        field: storage.save(
+            Recipe._meta.get_field(field).generate_filename(
+                recipe, content.name
+            ),
+            content,
+        )
+        for field, content in files.items()
+    }
+    updated = Recipe.objects.filter(pk=recipe.pk, image=source_name).update(
+        image_status=Recipe.ImageStatus.READY,
+        updated_at=timezone.now(),
+        **names,
+    )
+    if updated:
+        bump_content_version()
+        stale = [
+            source_name,
+            recipe.image_card.name,
+            recipe.image_thumbnail.name,
+        ]
+    else:
+        stale = names.values()
+    for name in stale:
+        if name:
+            storage.delete(name)
+    return bool(updated)
+
+
+def release_stale_images():
+    """Возвращает в pending рецепты, зависшие в processing.
+
+    Обработку мог не завершить воркер, который перезапустили или убили
+    по таймауту. Возвращает число таких рецептов.
+    """
+    deadline = timezone.now() - timedelta(
+        seconds=settings.RECIPE_IMAGE_PROCESSING_TIMEOUT
+    )
+    released = Recipe.objects.filter(
+        image_status=Recipe.ImageStatus.PROCESSING, updated_at__lt=deadline
+    ).update(
+        image_status=Recipe.ImageStatus.PENDING,
+        updated_at=timezone.now(),
+    )
+    if released:
+        bump_content_version()
+    return released
+
+
+def run_in_thread(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception("Ошибка обработки изображения рецепта %s", recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_image_processing(recipe_id):
+    """Ставит обработку изображения в фоновый пул потоков процесса.
+
+    При RECIPE_IMAGE_WORKERS = 0 рецепты остаются в статусе pending и
+    обрабатываются командой process_images, запущенной отдельно.
+    """
+    global _executor
+    if settings.RECIPE_IMAGE_WORKERS <= 0:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix="recipe-images",
+            )
+    _executor.submit(run_in_thread, recipe_id)
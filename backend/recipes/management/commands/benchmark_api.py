@@ -0,0 +1,370 @@
+import json
+import logging
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from rest_framework.authtoken.models import Token
+
+from config.queries import QueryProblemsError
+from recipes.counters import recount_counters
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartIngredient,
+    ShoppingList,
+    Tag,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    """Бенчмарк эндпоинтов API на синтетических данных.
+
+    Данные создаются во временной тестовой базе (SQLite или Postgres из
+    настроек), рабочая база не затрагивается. Для каждого маршрута
+    записываются число SQL-запросов, p50/p95 времени ответа и пиковая
+    память, результат сохраняется в JSON для сравнения между запусками.
+    Основные цифры снимаются с холодным кэшем ответов, чтобы N+1 в
+    сериализаторах не прятался за попаданиями, цифры с прогретым кэшем
+    пишутся рядом с префиксом warm_.
+    """
+
+    # Отдельный кэш в памяти: прогон очищает его перед каждым запросом и
+    # не должен трогать кэш работающего сайта.
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "benchmark_api",
+        }
+    }
+
+    help = "Бенчмарк эндпоинтов API: число запросов, задержка и память."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--recipes", type=int, default=500)
+        parser.add_argument("--ingredients", type=int, default=2000)
+        parser.add_argument("--tags", type=int, default=5)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=10)
+        parser.add_argument("--favorites-per-user", type=int, default=20)
+        parser.add_argument("--cart-per-user", type=int, default=10)
+        parser.add_argument("--follows-per-user", type=int, default=10)
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output",
+            default="benchmark.json",
+            help="Файл для результатов в формате JSON.",
+        )
+        parser.add_argument(
+            "--compare",
+            help="JSON предыдущего запуска для сравнения.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20.0,
+            help="Допустимый рост p95 в процентах при сравнении.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Не удалять тестовую базу после прогона.",
+        )
+
+    def handle(self, *args, **options):
+        # Строки метрик на каждый запрос только засорили бы вывод.
+        logging.getLogger("config.requests").setLevel(logging.WARNING)
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            dataset = self.seed(options)
+            # N+1 и медленные запросы в маршрутах роняют прогон.
+            with override_settings(
+                QUERY_INSPECTOR_MODE="raise", CACHES=self.CACHES
+            ):
+                routes = self.run_routes(dataset, options)
+        except QueryProblemsError as error:
+            raise CommandError(str(error))
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            teardown_test_environment()
+
+        result = {
+            "meta": {
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "database": connection.vendor,
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "dataset": dataset["sizes"],
+                "iterations": options["iterations"],
+            },
+            "routes": routes,
+        }
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        self.print_table(routes)
+        self.stdout.write(
+            self.style.SUCCESS(f"Результаты записаны в {options['output']}.")
+        )
+        if options["compare"]:
+            self.compare(routes, options["compare"], options["threshold"])
+
+    def seed(self, options):
+        rnd = random.Random(options["seed"])
+        password = make_password("benchmark-password")
+        users = User.objects.bulk_create(
+            User(
+                username=f"bench{i}",
+                email=f"bench{i}@example.com",
+                first_name="Bench",
+                last_name=str(i),
+                password=password,
+            )
+            for i in range(options["users"])
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f"Тег {i}", color=f"#{i:06X}", slug=f"tag-{i}")
+            for i in range(options["tags"])
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"ингредиент {i:05d}", measurement_unit="г")
+            for i in range(options["ingredients"])
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=rnd.choice(users),
+                name=f"Рецепт {i}",
+                image="recipe/images/benchmark.png",
+                text="Описание " * 20,
+                cooking_time=rnd.randint(1, 120),
+            )
+            for i in range(options["recipes"])
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in rnd.sample(tags, rnd.randint(1, len(tags)))
+        )
+        per_recipe = min(options["ingredients_per_recipe"], len(ingredients))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=rnd.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient in rnd.sample(ingredients, per_recipe)
+        )
+        for model, per_user in (
+            (FavoriteRecipe, options["favorites_per_user"]),
+            (ShoppingList, options["cart_per_user"]),
+        ):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe)
+                for user in users
+                for recipe in rnd.sample(recipes, min(per_user, len(recipes)))
+            )
+        Follow.objects.bulk_create(
+            Follow(user=user, follower=author)
+            for user in users
+            for author in rnd.sample(
+                users, min(options["follows_per_user"] + 1, len(users))
+            )
+            if author != user
+        )
+        ShoppingCartIngredient.objects.rebuild()
+        recount_counters()
+        viewer = users[0]
+        return {
+            "viewer": viewer,
+            "token": Token.objects.create(user=viewer).key,
+            "recipe": recipes[0],
+            "tags": tags,
+            "author": recipes[0].author,
+            "sizes": {
+                "users": len(users),
+                "tags": len(tags),
+                "ingredients": len(ingredients),
+                "recipes": len(recipes),
+                "recipe_ingredients": RecipeIngredient.objects.count(),
+                "favorites": FavoriteRecipe.objects.count(),
+                "shopping_list": ShoppingList.objects.count(),
+                "follows": Follow.objects.count(),
+            },
+        }
+
+    def get_routes(self, dataset, options):
+        limit = options["page_size"]
+        tags = "&".join(f"tags={tag.slug}" for tag in dataset["tags"][:2])
+        return {
+            "recipes_list_anonymous": (False, f"/api/recipes/?limit={limit}"),
+            "recipes_list": (True, f"/api/recipes/?limit={limit}"),
+            "recipes_detail": (True, f"/api/recipes/{dataset['recipe'].id}/"),
+            "recipes_filter_tags": (
+                True,
+                f"/api/recipes/?limit={limit}&{tags}",
+            ),
+            "recipes_filter_author": (
+                True,
+                f"/api/recipes/?limit={limit}"
+                f"&author={dataset['author'].id}",
+            ),
+            "recipes_filter_favorited": (
+                True,
+                f"/api/recipes/?limit={limit}&is_favorited=1&{tags}",
+            ),
+            "recipes_filter_shopping_cart": (
+                True,
+                f"/api/recipes/?limit={limit}&is_in_shopping_cart=1",
+            ),
+            "download_shopping_cart": (
+                True,
+                "/api/recipes/download_shopping_cart/",
+            ),
+            "subscriptions": (
+                True,
+                f"/api/users/subscriptions/?limit={limit}&recipes_limit=3",
+            ),
+            "users_list": (True, f"/api/users/?limit={limit}"),
+            "users_me": (True, "/api/users/me/"),
+            "tags_list": (False, "/api/tags/"),
+            "ingredients_search": (False, "/api/ingredients/?name=ингр"),
+        }
+
+    def request(self, client, url):
+        response = client.get(url)
+        if getattr(response, "streaming", False):
+            body = b"".join(response.streaming_content)
+        else:
+            body = response.content
+        return response.status_code, len(body)
+
+    def measure(self, client, url, options, cold):
+        """Время ответа и число SQL-запросов маршрута.
+
+        С cold кэш очищается перед каждым запросом, как после изменения
+        данных, иначе ответы отдает прогретый кэш.
+        """
+        for _ in range(options["warmup"]):
+            self.request(client, url)
+
+        timings = []
+        for _ in range(options["iterations"]):
+            if cold:
+                cache.clear()
+            start = time.perf_counter()
+            self.request(client, url)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            status, size = self.request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "status": status,
+            "response_bytes": size,
+            "queries": len(queries.captured_queries),
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    def run_routes(self, dataset, options):
+        anonymous = Client()
+        authorized = Client(HTTP_AUTHORIZATION=f"Token {dataset['token']}")
+        results = {}
+        for name, (auth, url) in self.get_routes(dataset, options).items():
+            client = authorized if auth else anonymous
+            cold = self.measure(client, url, options, cold=True)
+            warm = self.measure(client, url, options, cold=False)
+            results[name] = {
+                "url": url,
+                **cold,
+                **{
+                    f"warm_{key}": warm[key]
+                    for key in ("queries", "p50_ms", "p95_ms")
+                },
+            }
+        return results
+
+    def print_table(self, routes):
+        self.stdout.write(
+            f"{'маршрут':<32}{'код':>5}{'SQL':>6}"
+            f"{'p50, мс':>10}{'p95, мс':>10}{'память, КБ':>12}"
+            f"{'SQL warm':>10}{'p95 warm':>10}"
+        )
+        for name, row in routes.items():
+            self.stdout.write(
+                f"{name:<32}{row['status']:>5}{row['queries']:>6}"
+                f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                f"{row['peak_memory_kb']:>12.1f}"
+                f"{row['warm_queries']:>10}{row['warm_p95_ms']:>10.2f}"
+            )
+
+    def compare(self, routes, path, threshold):
+        try:
+            with open(path, encoding="utf-8") as file:
+                baseline = json.load(file)["routes"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            raise CommandError(f"Не удалось прочитать '{path}'.")
+
+        regressions = []
+        for name, row in routes.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            for prefix in ("", "warm_"):
+                key = f"{prefix}queries"
+                # В файлах старых прогонов нет цифр с прогретым кэшем.
+                if key in old and row[key] > old[key]:
+                    regressions.append(
+                        f"{name}: {key} {old[key]} -> {row[key]}"
+                    )
+            limit = old["p95_ms"] * (1 + threshold / 100)
+            if row["p95_ms"] > limit:
+                regressions.append(
+                    f"{name}: p95 {old['p95_ms']:.2f} -> "
+                    f"{row['p95_ms']:.2f} мс"
+                )
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.WARNING(line))
+            raise CommandError("Обнаружены регрессии производительности.")
+        self.stdout.write(self.style.SUCCESS("Регрессий не обнаружено."))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.rankings import compute_rankings
+
+
+class Command(BaseCommand):
+    """Команда для пересчета рейтингов популярного и трендов.
+
+    Запускается по расписанию (cron) или с --loop в отдельном
+    контейнере. Эндпоинты /api/recipes/popular/ и /api/recipes/trending/
+    читают только результат.
+    """
+
+    help = "Пересчитывает рейтинги рецептов для популярного и трендов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Не завершаться, а пересчитывать с интервалом.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=600.0,
+            help="Пауза между пересчетами в секундах.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            rows = compute_rankings(options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Рейтинги пересчитаны: {rows} рецептов за "
+                    f"{time.perf_counter() - start:.2f} с."
+                )
+            )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -1,37 +1,141 @@
+import csv
 import json
+import time
+from pathlib import Path
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.versions import bump_catalog_version
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_json(file):
+    """Поэлементно отдает JSON-массив, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    in_array = False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if not in_array and buffer:
+            if buffer[0] != "[":
+                raise json.JSONDecodeError("Ожидался массив", buffer, 0)
+            buffer, in_array = buffer[1:], True
+            continue
+        if buffer.startswith("]"):
+            return
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield item["name"], item["measurement_unit"]
+                buffer = buffer[end:]
+                continue
+        chunk = file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            raise json.JSONDecodeError("Неожиданный конец файла", buffer, 0)
+        buffer += chunk
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if not row or row == ["name", "measurement_unit"]:
+            continue
+        name, measurement_unit = row
+        yield name, measurement_unit
+
+
+READERS = {
+    "json": read_json,
+    "csv": read_csv,
+}
 
 
 class Command(BaseCommand):
-    """Команда для загрузки данных в БД."""
+    """Команда для загрузки данных в БД.
 
-    def import_ingredients(self, file="ingredients.json"):
-        file_path = f"data/{file}"
-        try:
-            with open(file_path, "r") as file:
-                data = json.load(file)
+    Файл читается потоково и пишется пачками через bulk_create в одной
+    транзакции. Уже существующие ингредиенты (по названию и единице
+    измерения) пропускаются, поэтому команду можно запускать повторно.
+    """
 
-                for item in data:
-                    name = item["name"]
-                    measurement_unit = item["measurement_unit"]
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            default=settings.BASE_DIR / "data" / "ingredients.json",
+            type=Path,
+            help="Путь к файлу с ингредиентами.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=READERS,
+            help="Формат файла, по умолчанию определяется по расширению.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество строк в одном INSERT.",
+        )
 
-                    ingredient = Ingredient(
-                        name=name, measurement_unit=measurement_unit
+    def import_ingredients(self, file, file_format, batch_size):
+        rows = 0
+        start = time.perf_counter()
+        with open(file, "r", encoding="utf-8", newline="") as source:
+            with transaction.atomic():
+                before = Ingredient.objects.count()
+                batch = []
+                for name, measurement_unit in READERS[file_format](source):
+                    batch.append(
+                        Ingredient(
+                            name=name.strip(),
+                            measurement_unit=measurement_unit.strip(),
+                        )
                     )
-                    ingredient.save()
+                    if len(batch) >= batch_size:
+                        Ingredient.objects.bulk_create(
+                            batch, ignore_conflicts=True
+                        )
+                        rows += len(batch)
+                        batch = []
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                rows += len(batch)
+                created = Ingredient.objects.count() - before
+                # bulk_create не шлет сигналов, а по версии справочников
+                # обновляются индекс ингредиентов и их ETag.
+                if created:
+                    transaction.on_commit(bump_catalog_version)
+        elapsed = time.perf_counter() - start
+        return rows, created, elapsed
 
-                self.stdout.write(
-                    self.style.SUCCESS("Данные успешно загружены.")
-                )
+    def handle(self, *args, **options):
+        file = options["file"]
+        file_format = options["format"] or file.suffix.lstrip(".").lower()
+        if file_format not in READERS:
+            self.stdout.write(
+                self.style.ERROR(f"Неизвестный формат файла '{file}'.")
+            )
+            return
+        try:
+            rows, created, elapsed = self.import_ingredients(
+                file, file_format, options["batch_size"]
+            )
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f"Файл '{file}' не найден."))
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, csv.Error, KeyError, ValueError):
             self.stdout.write(self.style.ERROR("Формат не соответствует."))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Произошла ошибка: {str(e)}"))
-
-    def handle(self, *args, **options):
-        self.import_ingredients()
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Данные успешно загружены: обработано {rows} строк, "
+                    f"добавлено {created}, "
+                    f"{rows / max(elapsed, 1e-6):.0f} строк/с."
+                )
+            )
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image, release_stale_images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда-воркер для фоновой обработки изображений рецептов.
+
+    Очередью служит сама таблица рецептов: обрабатываются рецепты в
+    статусе pending и зависшие в processing дольше
+    RECIPE_IMAGE_PROCESSING_TIMEOUT. С --loop команда работает постоянно
+    и подходит для отдельного контейнера при RECIPE_IMAGE_WORKERS = 0.
+    """
+
+    help = "Обрабатывает изображения рецептов, ожидающие обработки."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Заново обработать изображения всех рецептов.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Повторить рецепты, обработка которых упала.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Не завершаться, а опрашивать очередь.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Пауза между опросами очереди в секундах.",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="")
+        if options["all"]:
+            recipes.update(image_status=Recipe.ImageStatus.PENDING)
+        elif options["retry_failed"]:
+            recipes.filter(image_status=Recipe.ImageStatus.FAILED).update(
+                image_status=Recipe.ImageStatus.PENDING
+            )
+        while True:
+            released = release_stale_images()
+            if released:
+                self.stdout.write(
+                    f"Возвращено в очередь зависших изображений: {released}."
+                )
+            pending = list(
+                recipes.filter(
+                    image_status=Recipe.ImageStatus.PENDING
+                ).values_list("id", flat=True)[:100]
+            )
+            done = sum(process_recipe_image(pk) for pk in pending)
+            if pending:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Обработано изображений: {done} из {len(pending)}."
+                    )
+                )
+            if not options["loop"]:
+                if pending:
+                    continue
+                return
+            if not pending:
+                time.sleep(options["interval"])
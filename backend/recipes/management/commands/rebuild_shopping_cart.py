@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    """Команда для пересборки сводной таблицы корзин покупок."""
+
+    help = "Пересобирает ShoppingCartIngredient и сверяет его с корзинами."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только сверить таблицу, не пересобирая ее.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            ShoppingCartIngredient.objects.rebuild(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS("Таблица пересобрана."))
+
+        live = {
+            (row["recipe__shopping_list__user"], row["ingredient"]): (
+                row["amount"],
+                row["recipes_count"],
+            )
+            for row in ShoppingCartIngredient.objects.live_totals()
+        }
+        stored = {
+            (row["user"], row["ingredient"]): (
+                row["amount"],
+                row["recipes_count"],
+            )
+            for row in ShoppingCartIngredient.objects.values(
+                "user", "ingredient", "amount", "recipes_count"
+            )
+        }
+        mismatches = [
+            key
+            for key in live.keys() | stored.keys()
+            if live.get(key) != stored.get(key)
+        ]
+        if mismatches:
+            for user_id, ingredient_id in mismatches[:20]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Пользователь {user_id}, ингредиент {ingredient_id}: "
+                        f"ожидалось {live.get((user_id, ingredient_id))}, "
+                        f"в таблице {stored.get((user_id, ingredient_id))}"
+                    )
+                )
+            raise CommandError(f"Расхождений: {len(mismatches)}.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Таблица совпадает с корзинами ({len(stored)} строк)."
+            )
+        )
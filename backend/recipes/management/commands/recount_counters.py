@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import find_counter_mismatches, recount_counters
+
+
+class Command(BaseCommand):
+    """Команда для пересчета денормализованных счетчиков."""
+
+    help = (
+        "Пересчитывает счетчики избранного, корзин, рецептов и подписчиков "
+        "и сверяет их с таблицами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только сверить счетчики, не пересчитывая их.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            with transaction.atomic():
+                recount_counters()
+            self.stdout.write(self.style.SUCCESS("Счетчики пересчитаны."))
+
+        mismatches = find_counter_mismatches()
+        if mismatches:
+            for model, field, pk, stored, live in mismatches[:20]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{model.__name__} {pk}, {field}: "
+                        f"ожидалось {live}, в базе {stored}"
+                    )
+                )
+            raise CommandError(f"Расхождений: {len(mismatches)}.")
+        self.stdout.write(
+            self.style.SUCCESS("Счетчики совпадают с таблицами.")
+        )
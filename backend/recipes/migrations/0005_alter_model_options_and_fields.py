@@ -0,0 +1,90 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:57
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("recipes", "0004_alter_shoppinglist_user"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="shoppinglist",
+            options={
+                "default_related_name": "shopping_list",
+                "verbose_name": "Покупка",
+                "verbose_name_plural": "Покупки",
+            },
+        ),
+        migrations.AlterField(
+            model_name="favoriterecipe",
+            name="recipe",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="recipes.recipe",
+                verbose_name="Рецепт",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="favoriterecipe",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Пользователь",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="cooking_time",
+            field=models.PositiveSmallIntegerField(
+                validators=[django.core.validators.MinValueValidator(1)],
+                verbose_name="Время приготовления в минутах",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shoppinglist",
+            name="recipe",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="recipes.recipe",
+                verbose_name="Рецепт",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shoppinglist",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Пользователь",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tag",
+            name="color",
+            field=models.CharField(
+                max_length=7,
+                unique=True,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        message="Цвет должен быть в формате hex-кода. Пример #FFFFFF",
+                        regex="^#([A-Fa-f0-9]{6}|[A-Fa-f0-9]{3})$",
+                    )
+                ],
+                verbose_name="Цвет тэга",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="recipeingredient",
+            constraint=models.UniqueConstraint(
+                fields=("recipe", "ingredient"), name="unique_ingredient"
+            ),
+        ),
+    ]
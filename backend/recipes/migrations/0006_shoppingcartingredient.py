@@ -0,0 +1,100 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_shopping_cart_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+    ShoppingCartIngredient = apps.get_model(
+        "recipes", "ShoppingCartIngredient"
+    )
+    totals = (
+        RecipeIngredient.objects.filter(recipe__shopping_list__isnull=False)
+        .values("recipe__shopping_list__user", "ingredient")
+        .annotate(amount=Sum("amount"), recipes_count=Count("id"))
+        .order_by()
+    )
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=row["recipe__shopping_list__user"],
+                ingredient_id=row["ingredient"],
+                amount=row["amount"],
+                recipes_count=row["recipes_count"],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("recipes", "0005_alter_model_options_and_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShoppingCartIngredient",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Суммарное количество"
+                    ),
+                ),
+                (
+                    "recipes_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число рецептов с ингредиентом"
+                    ),
+                ),
+                (
+                    "ingredient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shopping_cart_totals",
+                        to="recipes.ingredient",
+                        verbose_name="Ингредиент",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shopping_cart_ingredients",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ингредиент в корзине",
+                "verbose_name_plural": "Ингредиенты в корзине",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="shoppingcartingredient",
+            constraint=models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique_shopping_cart_ingredient",
+            ),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_ingredients, migrations.RunPython.noop
+        ),
+    ]
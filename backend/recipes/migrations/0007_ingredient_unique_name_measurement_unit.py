@@ -0,0 +1,72 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:58
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает дубли ингредиентов, созданные повторной загрузкой."""
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+    ShoppingCartIngredient = apps.get_model(
+        "recipes", "ShoppingCartIngredient"
+    )
+    duplicates = (
+        Ingredient.objects.values("name", "measurement_unit")
+        .annotate(keep_id=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in duplicates:
+        keep_id = group["keep_id"]
+        extra = Ingredient.objects.filter(
+            name=group["name"], measurement_unit=group["measurement_unit"]
+        ).exclude(id=keep_id)
+        for row in RecipeIngredient.objects.filter(ingredient__in=extra):
+            existing = RecipeIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=keep_id
+            ).first()
+            if existing:
+                existing.amount += row.amount
+                existing.save(update_fields=("amount",))
+                row.delete()
+            else:
+                row.ingredient_id = keep_id
+                row.save(update_fields=("ingredient",))
+        ShoppingCartIngredient.objects.filter(ingredient__in=extra).delete()
+        ShoppingCartIngredient.objects.filter(ingredient_id=keep_id).delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user_id=row["recipe__shopping_list__user"],
+                ingredient_id=keep_id,
+                amount=row["amount"],
+                recipes_count=row["recipes_count"],
+            )
+            for row in RecipeIngredient.objects.filter(
+                ingredient_id=keep_id, recipe__shopping_list__isnull=False
+            )
+            .values("recipe__shopping_list__user")
+            .annotate(amount=Sum("amount"), recipes_count=Count("id"))
+            .order_by()
+        )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0006_shoppingcartingredient"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="ingredient",
+            constraint=models.UniqueConstraint(
+                fields=("name", "measurement_unit"),
+                name="unique_ingredient_measurement_unit",
+            ),
+        ),
+    ]
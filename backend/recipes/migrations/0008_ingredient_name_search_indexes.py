@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:59
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    """Триграммный индекс для поиска по вхождению, только в PostgreSQL."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx "
+        "ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS ingredient_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_ingredient_unique_name_measurement_unit"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(
+                django.db.models.functions.text.Upper("name"),
+                name="ingredient_name_upper_idx",
+            ),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
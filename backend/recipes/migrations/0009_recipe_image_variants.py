@@ -0,0 +1,31 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0008_ingredient_name_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_card",
+            field=models.ImageField(
+                blank=True,
+                upload_to="recipe/cards/",
+                verbose_name="Изображение для карточки",
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="image_thumbnail",
+            field=models.ImageField(
+                blank=True,
+                upload_to="recipe/thumbnails/",
+                verbose_name="Миниатюра изображения",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0009_recipe_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает обработки"),
+                    ("processing", "Обрабатывается"),
+                    ("ready", "Готово"),
+                    ("failed", "Ошибка обработки"),
+                ],
+                default="pending",
+                max_length=10,
+                verbose_name="Статус обработки изображения",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Recipe.objects.update(updated_at=models.F("pub_date"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0010_recipe_image_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="Дата изменения",
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ("recipes", "Recipe", "favorites_count", "FavoriteRecipe", "recipe"),
+    ("recipes", "Recipe", "shopping_count", "ShoppingList", "recipe"),
+    ("users", "User", "recipes_count", "Recipe", "author"),
+    ("users", "User", "followers_count", "Follow", "follower"),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app_label, model_name, field, source_name, foreign_key in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        source = apps.get_model(
+            "users" if source_name == "Follow" else "recipes", source_name
+        )
+        live = Coalesce(
+            Subquery(
+                source.objects.filter(**{foreign_key: OuterRef("pk")})
+                .order_by()
+                .values(foreign_key)
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            0,
+        )
+        model.objects.update(**{field: live})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0012_recipe_pub_date_id_index"),
+        ("users", "0005_user_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Добавлен в избранное"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="shopping_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Добавлен в корзины"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
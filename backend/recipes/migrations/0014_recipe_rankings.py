@@ -0,0 +1,104 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:14
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Когда добавлены существующие записи, неизвестно. Дата вне любого окна
+# трендов, иначе после выкладки тренды повторяли бы популярность за все
+# время.
+UNKNOWN_CREATED_AT = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def backfill_created_at(apps, schema_editor):
+    for model_name in ("FavoriteRecipe", "ShoppingList"):
+        apps.get_model("recipes", model_name).objects.update(
+            created_at=UNKNOWN_CREATED_AT
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0013_recipe_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="favoriterecipe",
+            name="created_at",
+            field=models.DateTimeField(
+                db_index=True, null=True, verbose_name="Дата добавления"
+            ),
+        ),
+        migrations.AddField(
+            model_name="shoppinglist",
+            name="created_at",
+            field=models.DateTimeField(
+                db_index=True, null=True, verbose_name="Дата добавления"
+            ),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="favoriterecipe",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                verbose_name="Дата добавления",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shoppinglist",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                verbose_name="Дата добавления",
+            ),
+        ),
+        migrations.CreateModel(
+            name="RecipeRanking",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ranking",
+                        serialize=False,
+                        to="recipes.recipe",
+                        verbose_name="Рецепт",
+                    ),
+                ),
+                (
+                    "popular_score",
+                    models.FloatField(default=0, verbose_name="Популярность"),
+                ),
+                (
+                    "trending_score",
+                    models.FloatField(
+                        default=0,
+                        verbose_name="Популярность за последнее время",
+                    ),
+                ),
+                (
+                    "computed_at",
+                    models.DateTimeField(verbose_name="Дата расчета"),
+                ),
+            ],
+            options={
+                "verbose_name": "Рейтинг рецепта",
+                "verbose_name_plural": "Рейтинги рецептов",
+                "indexes": [
+                    models.Index(
+                        fields=["-popular_score"], name="ranking_popular_idx"
+                    ),
+                    models.Index(
+                        fields=["-trending_score"], name="ranking_trending_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0014_recipe_rankings"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="ingredient",
+            name="ingredient_name_upper_idx",
+        ),
+    ]
@@ -1,9 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest
 from django.utils.html import format_html
 
+from users.models import CountersMixin
+
+from .versions import bump_viewer_version
+
 User = get_user_model()
 
 
@@ -64,14 +70,30 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = "Ингридиент"
         verbose_name_plural = "Ингридиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("name", "measurement_unit"),
+                name="unique_ingredient_measurement_unit",
+            )
+        ]
+        # Поиск по началу и по вхождению обслуживает триграммный GIN-индекс
+        # по UPPER(name) из миграции 0008, он есть только в PostgreSQL.
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель рецептов."""
 
+    counter_fields = ("favorites_count", "shopping_count")
+
+    class ImageStatus(models.TextChoices):
+        PENDING = "pending", "Ожидает обработки"
+        PROCESSING = "processing", "Обрабатывается"
+        READY = "ready", "Готово"
+        FAILED = "failed", "Ошибка обработки"
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -87,6 +109,22 @@ class Recipe(models.Model):
         upload_to="recipe/images/",
         verbose_name="Изображение рецепта",
     )
+    image_card = models.ImageField(
+        upload_to="recipe/cards/",
+        blank=True,
+        verbose_name="Изображение для карточки",
+    )
+    image_thumbnail = models.ImageField(
+        upload_to="recipe/thumbnails/",
+        blank=True,
+        verbose_name="Миниатюра изображения",
+    )
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.PENDING,
+        verbose_name="Статус обработки изображения",
+    )
     text = models.TextField(
         verbose_name="Описание рецепта",
     )
@@ -110,11 +148,28 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name="Дата публикации",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения",
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Добавлен в избранное",
+    )
+    shopping_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Добавлен в корзины",
+    )
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ("-pub_date",)
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(
+                fields=("-pub_date", "-id"), name="recipe_pub_date_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -149,6 +204,79 @@ class RecipeIngredient(models.Model):
         return f"{self.ingredient.name} ({self.recipe.name})"
 
 
+class UserRecipeManager(models.Manager):
+    """Пакетное добавление и удаление рецептов пользователя.
+
+    Строки пишутся одним INSERT и удаляются одним DELETE в обход
+    сигналов, поэтому счетчик в рецепте и версия пользователя меняются
+    здесь же. Методы вызываются внутри транзакции.
+    """
+
+    def lock_user(self, user):
+        """Блокирует строку пользователя до конца транзакции.
+
+        Пакеты одного пользователя выполняются по очереди, иначе два
+        параллельных запроса посчитают один рецепт добавленным дважды.
+        """
+        list(
+            User.objects.select_for_update()
+            .filter(pk=user.pk)
+            .values_list("pk", flat=True)
+        )
+
+    def add_many(self, user, recipe_ids):
+        """Добавляет рецепты и возвращает id тех, которых еще не было."""
+        self.lock_user(user)
+        existing = set(
+            self.filter(user=user, recipe_id__in=recipe_ids).values_list(
+                "recipe_id", flat=True
+            )
+        )
+        added = [pk for pk in recipe_ids if pk not in existing]
+        self.bulk_create(
+            (self.model(user=user, recipe_id=pk) for pk in added),
+            ignore_conflicts=True,
+        )
+        self.recipes_changed(user, added, 1)
+        return added
+
+    def remove_many(self, user, recipe_ids):
+        """Удаляет рецепты и возвращает id тех, что были у пользователя."""
+        self.lock_user(user)
+        removed = list(
+            self.filter(user=user, recipe_id__in=recipe_ids).values_list(
+                "recipe_id", flat=True
+            )
+        )
+        if removed:
+            self.delete_rows(user, removed)
+        self.recipes_changed(user, removed, -1)
+        return removed
+
+    def delete_rows(self, user, recipe_ids):
+        # QuerySet.delete() отправил бы post_delete на каждую строку.
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {quote(meta.db_table)} "
+                f"WHERE {quote(meta.get_field('user').column)} = %s "
+                f"AND {quote(meta.get_field('recipe').column)} "
+                f"IN ({', '.join(['%s'] * len(recipe_ids))})",
+                [user.pk, *recipe_ids],
+            )
+
+    def recipes_changed(self, user, recipe_ids, delta):
+        if not recipe_ids:
+            return
+        field = self.model.counter_field
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+        transaction.on_commit(lambda: bump_viewer_version(user.id))
+
+
 class FavoriteShoppingModel(models.Model):
     """Абстрактная модель для добавления в избранное и покупки."""
 
@@ -163,6 +291,13 @@ class FavoriteShoppingModel(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Дата добавления",
+    )
+
+    objects = UserRecipeManager()
 
     class Meta:
         abstract = True
@@ -174,6 +309,8 @@ class FavoriteShoppingModel(models.Model):
 class FavoriteRecipe(FavoriteShoppingModel):
     """Модель избранного."""
 
+    counter_field = "favorites_count"
+
     class Meta(FavoriteShoppingModel.Meta):
         verbose_name = "Избранный рецепт"
         verbose_name_plural = "Избранные рецепты"
@@ -189,6 +326,8 @@ class FavoriteRecipe(FavoriteShoppingModel):
 class ShoppingList(FavoriteShoppingModel):
     """Корзина покупок."""
 
+    counter_field = "shopping_count"
+
     class Meta(FavoriteShoppingModel.Meta):
         verbose_name = "Покупка"
         verbose_name_plural = "Покупки"
@@ -199,3 +338,223 @@ class ShoppingList(FavoriteShoppingModel):
                 name="unique_shopping",
             )
         ]
+
+
+class RecipeRanking(models.Model):
+    """Предрассчитанный рейтинг рецепта.
+
+    Заполняется командой compute_rankings, эндпоинты популярного и
+    трендов только читают его по индексу.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ranking",
+        verbose_name="Рецепт",
+    )
+    popular_score = models.FloatField(
+        default=0,
+        verbose_name="Популярность",
+    )
+    trending_score = models.FloatField(
+        default=0,
+        verbose_name="Популярность за последнее время",
+    )
+    computed_at = models.DateTimeField(
+        verbose_name="Дата расчета",
+    )
+
+    class Meta:
+        verbose_name = "Рейтинг рецепта"
+        verbose_name_plural = "Рейтинги рецептов"
+        indexes = [
+            models.Index(
+                fields=("-popular_score",), name="ranking_popular_idx"
+            ),
+            models.Index(
+                fields=("-trending_score",), name="ranking_trending_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe} ({self.popular_score:.1f})"
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """Инкрементальное обновление сводной таблицы корзины покупок."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет к строкам пользователей изменения по ингредиентам.
+
+        deltas: {ingredient_id: (изменение amount, изменение recipes_count)}.
+        Недостающие строки сначала создаются с нулями, затем все значения
+        меняются через F(), поэтому параллельные запросы не теряют данные.
+        """
+        user_ids = list(user_ids)
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                (
+                    self.model(user_id=user_id, ingredient_id=ingredient_id)
+                    for user_id in user_ids
+                    for ingredient_id, (amount, count) in deltas.items()
+                    if count > 0
+                ),
+                ignore_conflicts=True,
+            )
+            rows = list(
+                self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+            )
+            for row in rows:
+                amount, count = deltas[row.ingredient_id]
+                row.amount = F("amount") + amount
+                row.recipes_count = F("recipes_count") + count
+            self.bulk_update(rows, ("amount", "recipes_count"))
+            self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=deltas,
+                recipes_count=0,
+            ).delete()
+
+    def recipe_amounts(self, recipe):
+        return dict(
+            RecipeIngredient.objects.filter(recipe=recipe).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+
+    def add_recipe(self, user, recipe):
+        amounts = self.recipe_amounts(recipe)
+        self.apply_deltas(
+            (user.id,),
+            {key: (amount, 1) for key, amount in amounts.items()},
+        )
+
+    def remove_recipe(self, user, recipe):
+        amounts = self.recipe_amounts(recipe)
+        self.apply_deltas(
+            (user.id,),
+            {key: (-amount, -1) for key, amount in amounts.items()},
+        )
+
+    def recipes_deltas(self, recipe_ids, sign):
+        rows = (
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .values("ingredient_id")
+            .annotate(amount=Sum("amount"), recipes_count=Count("id"))
+            .order_by()
+        )
+        return {
+            row["ingredient_id"]: (
+                sign * row["amount"],
+                sign * row["recipes_count"],
+            )
+            for row in rows
+        }
+
+    def add_recipes(self, user, recipe_ids):
+        """Добавляет в корзину сразу несколько рецептов одним запросом."""
+        self.apply_deltas((user.id,), self.recipes_deltas(recipe_ids, 1))
+
+    def remove_recipes(self, user, recipe_ids):
+        self.apply_deltas((user.id,), self.recipes_deltas(recipe_ids, -1))
+
+    def remove_recipe_for_all(self, recipe):
+        """Вычитает рецепт из корзин всех пользователей перед удалением."""
+        amounts = self.recipe_amounts(recipe)
+        self.apply_deltas(
+            ShoppingList.objects.filter(recipe=recipe).values_list(
+                "user_id", flat=True
+            ),
+            {key: (-amount, -1) for key, amount in amounts.items()},
+        )
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит в корзины изменения состава ингредиентов рецепта."""
+        deltas = {}
+        for key in old_amounts.keys() | new_amounts.keys():
+            old, new = old_amounts.get(key), new_amounts.get(key)
+            if old == new:
+                continue
+            deltas[key] = (
+                (new or 0) - (old or 0),
+                (new is not None) - (old is not None),
+            )
+        users = ShoppingList.objects.filter(recipe=recipe).values_list(
+            "user_id", flat=True
+        )
+        self.apply_deltas(users, deltas)
+
+    def live_totals(self):
+        """Агрегат корзин, посчитанный напрямую из ShoppingList."""
+        return (
+            RecipeIngredient.objects.filter(
+                recipe__shopping_list__isnull=False
+            )
+            .values("recipe__shopping_list__user", "ingredient")
+            .annotate(amount=Sum("amount"), recipes_count=Count("id"))
+            .order_by()
+        )
+
+    def rebuild(self, batch_size=1000):
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=row["recipe__shopping_list__user"],
+                        ingredient_id=row["ingredient"],
+                        amount=row["amount"],
+                        recipes_count=row["recipes_count"],
+                    )
+                    for row in self.live_totals().iterator()
+                ),
+                batch_size=batch_size,
+            )
+
+
+class ShoppingCartIngredient(models.Model):
+    """Сводное количество ингредиента в корзине пользователя.
+
+    Обновляется при добавлении и удалении рецептов из корзины, чтобы
+    выгрузка списка покупок читала готовые суммы по индексу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_cart_ingredients",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_cart_totals",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Суммарное количество",
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Число рецептов с ингредиентом",
+    )
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        verbose_name = "Ингредиент в корзине"
+        verbose_name_plural = "Ингредиенты в корзине"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique_shopping_cart_ingredient",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.ingredient} ({self.amount})"
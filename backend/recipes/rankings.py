@@ -0,0 +1,72 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import FavoriteRecipe, Recipe, RecipeRanking, ShoppingList
+
+FAVORITE_WEIGHT = 2.0
+SHOPPING_WEIGHT = 1.0
+
+
+def popular_scores():
+    """Популярность за все время по денормализованным счетчикам."""
+    recipes = Recipe.objects.filter(
+        Q(favorites_count__gt=0) | Q(shopping_count__gt=0)
+    ).values_list("id", "favorites_count", "shopping_count")
+    return {
+        recipe_id: FAVORITE_WEIGHT * favorites + SHOPPING_WEIGHT * shopping
+        for recipe_id, favorites, shopping in recipes
+    }
+
+
+def trending_scores(now):
+    """Добавления за окно с экспоненциальным затуханием по возрасту.
+
+    Каждое добавление весит 0.5 ** (возраст / период полураспада).
+    База отдает только число добавлений по рецептам и часам.
+    """
+    half_life = timedelta(hours=settings.RECIPE_TRENDING_HALF_LIFE)
+    since = now - timedelta(days=settings.RECIPE_TRENDING_WINDOW)
+    scores = defaultdict(float)
+    for model, weight in (
+        (FavoriteRecipe, FAVORITE_WEIGHT),
+        (ShoppingList, SHOPPING_WEIGHT),
+    ):
+        rows = (
+            model.objects.filter(created_at__gte=since)
+            .annotate(hour=TruncHour("created_at"))
+            .order_by()
+            .values("recipe", "hour")
+            .annotate(total=Count("pk"))
+        )
+        for row in rows.iterator():
+            age = max(now - row["hour"], timedelta()) / half_life
+            scores[row["recipe"]] += weight * row["total"] * 0.5**age
+    return scores
+
+
+def compute_rankings(batch_size=1000):
+    """Пересчитывает RecipeRanking целиком и возвращает число строк."""
+    now = timezone.now()
+    popular = popular_scores()
+    trending = trending_scores(now)
+    with transaction.atomic():
+        RecipeRanking.objects.all().delete()
+        RecipeRanking.objects.bulk_create(
+            (
+                RecipeRanking(
+                    recipe_id=recipe_id,
+                    popular_score=popular.get(recipe_id, 0),
+                    trending_score=trending.get(recipe_id, 0),
+                    computed_at=now,
+                )
+                for recipe_id in popular.keys() | trending.keys()
+            ),
+            batch_size=batch_size,
+        )
+    return len(popular.keys() | trending.keys())
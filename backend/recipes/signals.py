@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Follow
+from .counters import COUNTERS, change_counter
+from .models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag,
+)
+from .versions import (
+    bump_catalog_version,
+    bump_content_version,
+    bump_viewer_version,
+)
+
+User = get_user_model()
+
+CONTENT_MODELS = (Recipe, RecipeIngredient, Tag, Ingredient, User)
+CATALOG_MODELS = (Tag, Ingredient)
+VIEWER_MODELS = (FavoriteRecipe, ShoppingList, Follow)
+
+# Поля пользователя, которые не попадают в ответы API.
+USER_SERVICE_FIELDS = {"last_login", "password"}
+
+
+def service_fields_only(update_fields):
+    return bool(update_fields) and update_fields <= USER_SERVICE_FIELDS
+
+
+def content_changed(sender, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет last_login, ответы API от этого не
+    # меняются, а сброс версии выбросил бы весь кэш.
+    if sender is User and service_fields_only(update_fields):
+        return
+    # Версия меняется после коммита, иначе параллельный запрос успеет
+    # закэшировать еще не закоммиченное состояние под новой версией.
+    transaction.on_commit(bump_content_version)
+
+
+def catalog_changed(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+def viewer_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_viewer_version(instance.user_id))
+
+
+for model in CONTENT_MODELS:
+    post_save.connect(content_changed, sender=model)
+    post_delete.connect(content_changed, sender=model)
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model)
+    post_delete.connect(catalog_changed, sender=model)
+
+for model in VIEWER_MODELS:
+    post_save.connect(viewer_changed, sender=model)
+    post_delete.connect(viewer_changed, sender=model)
+
+
+def counter_receiver(model, field, foreign_key, delta):
+    def update_counter(sender, instance, created=True, **kwargs):
+        if created:
+            pk = getattr(instance, f"{foreign_key}_id")
+            change_counter(model, pk, field, delta)
+
+    return update_counter
+
+
+# Счетчики меняются через F() в базе, параллельные запросы не теряют
+# изменений.
+for model, field, source, foreign_key in COUNTERS:
+    post_save.connect(
+        counter_receiver(model, field, foreign_key, 1),
+        sender=source,
+        weak=False,
+    )
+    post_delete.connect(
+        counter_receiver(model, field, foreign_key, -1),
+        sender=source,
+        weak=False,
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, action, **kwargs):
+    if action.startswith("post_"):
+        content_changed(sender)
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields, **kwargs):
+    """Автор входит в ответ рецепта, поэтому его правка меняет ETag."""
+    if created or service_fields_only(update_fields):
+        return
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
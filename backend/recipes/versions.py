@@ -0,0 +1,86 @@
+import time
+
+from django.core.cache import cache
+
+CONTENT_VERSION_KEY = "recipes:content_version"
+CATALOG_VERSION_KEY = "recipes:catalog_version"
+
+
+def viewer_version_key(user_id):
+    return f"recipes:viewer_version:{user_id}"
+
+
+def get_version(key):
+    """Текущая версия по ключу: время последнего изменения в наносекундах.
+
+    Если кэш не хранит значения (DummyCache), версия каждый раз новая,
+    поэтому закэшированные ответы и ETag просто не совпадут.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version or time.time_ns()
+
+
+async def aget_version(key):
+    """Асинхронный вариант get_version."""
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version or time.time_ns()
+
+
+def bump_version(key):
+    """Меняет версию: все ключи со старой версией перестают читаться."""
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_content_version():
+    """Версия содержимого рецептов для ключей кэша."""
+    return get_version(CONTENT_VERSION_KEY)
+
+
+async def aget_content_version():
+    return await aget_version(CONTENT_VERSION_KEY)
+
+
+def bump_content_version():
+    bump_version(CONTENT_VERSION_KEY)
+
+
+def get_catalog_version():
+    """Версия справочников: тегов и ингредиентов."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+async def aget_catalog_version():
+    return await aget_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def get_viewer_version(user_id):
+    """Версия избранного, корзины и подписок пользователя."""
+    return get_version(viewer_version_key(user_id))
+
+
+async def aget_viewer_version(user_id):
+    return await aget_version(viewer_version_key(user_id))
+
+
+def bump_viewer_version(user_id):
+    bump_version(viewer_version_key(user_id))
+
+
+def version_timestamp(*versions):
+    """Время самого свежего изменения в секундах для Last-Modified."""
+    return max(versions) // 10**9
+
+
+def datetime_version(value):
+    """Дата изменения объекта в наносекундах, как версии из кэша."""
+    return int(value.timestamp() * 10**9)
@@ -22,6 +22,8 @@ class CustomUserAdmin(UserAdmin):
         "email",
         "first_name",
         "last_name",
+        "recipes_count",
+        "followers_count",
     )
     list_filter = ("email", "username")
     list_per_page = settings.LIST_PER_PAGE
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_alter_follow_follower_alter_follow_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Число подписчиков"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="recipes_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Число рецептов"
+            ),
+        ),
+    ]
@@ -2,9 +2,31 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Полное сохранение модели не трогает поля счетчиков.
+
+    Счетчики меняются через F() в базе, а объект мог быть загружен до
+    этих изменений: save() без update_fields вернул бы старые значения.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Модель пользователей."""
 
+    counter_fields = ("recipes_count", "followers_count")
+
     email = models.EmailField(
         max_length=254,
         unique=True,
@@ -12,6 +34,14 @@ class User(AbstractUser):
     )
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Число рецептов",
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Число подписчиков",
+    )
 
     class Meta:
         verbose_name = "Пользователь"